@@ -0,0 +1,119 @@
+"""
+Simulation of AdaptiveLimiter against a fake Ollama server with a fixed number of parallel slots, exiting non-zero if
+the limit does not settle near the number of slots when the server is saturated, or if it throttles callers (or grows
+far beyond them) when it is not. Requests mix long translations with short critic verdicts (a long prompt and a
+handful of generated tokens). The limiter is driven directly, without a client, so this does not use test/fakes.py.
+
+    python test/adaptive_concurrency.py [slots]
+"""
+
+import queue
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from turtletranslate.limiter import AdaptiveLimiter
+from turtletranslate.logger import logger
+
+SLOTS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+CALLERS = 24  # Like a high -j, far more callers than the server can serve at once
+DURATION = 8.0  # Seconds per scenario
+SECONDS_PER_TOKEN = 0.0002
+SECONDS_PER_PROMPT_TOKEN = 0.00002
+WORKLOAD = [
+    (400, (100, 400)),  # Translation: prompt tokens, range of generated tokens
+    (900, (3, 8)),  # Structured critic verdict
+]
+
+
+class SimulatedServer:
+    """
+    Serves `slots` requests at once, the rest wait in its FIFO queue. Parallel requests are slightly slower each.
+    Responses report their token counts and durations like Ollama does (the time spent computing, not waiting).
+    """
+
+    def __init__(self, slots: int):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = 0
+        for _ in range(slots):
+            threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            request, done = self._queue.get()
+            with self._lock:
+                self._active += 1
+                active = self._active
+            slowdown = 1 + 0.05 * (active - 1)
+            request.prompt_eval_duration = request.prompt_eval_count * SECONDS_PER_PROMPT_TOKEN * slowdown * 1e9
+            request.eval_duration = request.eval_count * SECONDS_PER_TOKEN * slowdown * 1e9
+            time.sleep((request.prompt_eval_duration + request.eval_duration) / 1e9)
+            with self._lock:
+                self._active -= 1
+            done.set()
+
+    def generate(self, prompt_tokens: int, tokens: int) -> SimpleNamespace:
+        response, done = SimpleNamespace(prompt_eval_count=prompt_tokens, eval_count=tokens), threading.Event()
+        self._queue.put((response, done))
+        done.wait()
+        return response
+
+
+def caller(server: SimulatedServer, limiter: AdaptiveLimiter, stop: threading.Event):
+    requests = 0
+    while not stop.is_set():
+        prompt_tokens, tokens = WORKLOAD[requests % len(WORKLOAD)]
+        requests += 1
+        with limiter.request() as slot:
+            slot.update(server.generate(prompt_tokens, random.randint(*tokens)))
+
+
+def simulate(callers: int) -> float:
+    """Run callers against a fresh server and limiter, returning the average limit over the second half."""
+    server, limiter, stop = SimulatedServer(SLOTS), AdaptiveLimiter(initial=1), threading.Event()
+    threads = [threading.Thread(target=caller, args=(server, limiter, stop), daemon=True) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+
+    limits = list()
+    started = time.monotonic()
+    while time.monotonic() - started < DURATION:
+        time.sleep(0.5)
+        stats = limiter.stats()
+        limits.append(stats["limit"])
+        logger.info(
+            f"{time.monotonic() - started:5.1f}s limit {stats['limit']:2d}, in flight {stats['in_flight']:2d}, "
+            f"{stats['requests_per_second']:6.1f} requests/s, {stats['tokens_per_second']:8.0f} tokens/s"
+        )
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    settled = limits[len(limits) // 2 :]
+    return sum(settled) / len(settled)
+
+
+def main() -> int:
+    failed = False
+    saturated = simulate(CALLERS)
+    logger.info(f"Saturated: average limit over the second half {saturated:.1f} ({SLOTS} server slots)")
+    if not SLOTS * 0.5 <= saturated <= SLOTS * 2:
+        logger.error(f"The limit did not settle near the {SLOTS} server slots")
+        failed = True
+
+    # Fewer callers than slots never wait in the server's queue, so the limit should never hold them back, but it should
+    # not grow far beyond them either, or a burst of real load would flood the server
+    callers = max(1, SLOTS // 2)
+    uncontended = simulate(callers)
+    logger.info(f"Uncontended: average limit over the second half {uncontended:.1f} ({callers} callers)")
+    if not callers <= uncontended <= callers + 2:
+        logger.error(f"The limit did not stay just above the {callers} callers without any congestion")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
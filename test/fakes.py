@@ -0,0 +1,91 @@
+"""
+Fake Ollama client and setup shared by the test scripts, so the pipeline runs without a server. Scripts subclass
+FakeClient and override the responses the behaviour they check depends on.
+"""
+
+import json
+import logging
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from turtletranslate import TurtleTranslator
+from turtletranslate.cache import NullCache
+from turtletranslate.logger import logger
+
+
+class FakeClient:
+    """
+    Answers each request with the method for its kind: worker (translations and revisions), verdict and reason
+    (structured critic requests) or free_form (a critic without structured outputs). By default it translates by
+    uppercasing and approves everything. The prompts and generated tokens of every kind are recorded.
+    """
+
+    def __init__(self):
+        self.prompts = dict()  # Kind -> prompts, in order
+        self.eval_count = dict()  # Kind -> generated tokens
+
+    @property
+    def calls(self) -> int:
+        return sum(len(prompts) for prompts in self.prompts.values())
+
+    def show(self, model):
+        return dict()
+
+    def generate(self, model, prompt, system="", options=None, format=None, **kwargs):
+        properties = (format or dict()).get("properties", dict())
+        if "approved" in properties:
+            kind = "verdict"
+        elif "reason" in properties:
+            kind = "reason"
+        elif "==TRANSLATED_VERSION==" in prompt:
+            kind = "free_form"
+        else:
+            kind = "worker"
+        text = getattr(self, kind)(prompt)
+        eval_count = max(1, len(text) // 4)
+        self.prompts.setdefault(kind, list()).append(prompt)
+        self.eval_count[kind] = self.eval_count.get(kind, 0) + eval_count
+        return SimpleNamespace(response=text, eval_count=eval_count, prompt_eval_count=len(prompt) // 4)
+
+    def worker(self, prompt: str) -> str:
+        return section(prompt).upper()
+
+    def verdict(self, prompt: str) -> str:
+        return json.dumps({"approved": True})
+
+    def reason(self, prompt: str) -> str:
+        return json.dumps({"reason": "The translation is not accurate."})
+
+    def free_form(self, prompt: str) -> str:
+        return "YES"
+
+
+def section(prompt: str) -> str:
+    """The section at the end of a worker prompt."""
+    return prompt.rsplit(":\n", 1)[1]
+
+
+def translation(prompt: str) -> str:
+    """The translation a critic prompt asks about."""
+    return prompt.split("==TRANSLATED_VERSION==\n", 1)[1]
+
+
+def document(sections: int) -> str:
+    return "\n\n".join(f"## Section {i}\n\nThis is the text of section number {i}." for i in range(sections))
+
+
+def translator(client: FakeClient, document: str, **options) -> TurtleTranslator:
+    """A translator of document for client, without caches or stats to carry state between runs."""
+    options = {"model": "fake", "target_language": "Norwegian", "structured_verdicts": True, **options}
+    return TurtleTranslator(client=client, document=document, cache=NullCache(), add_stats=False, **options)
+
+
+@contextmanager
+def quiet():
+    """Silence the logger, which logs every attempt and rejection otherwise."""
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
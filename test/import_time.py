@@ -0,0 +1,51 @@
+"""
+Import time benchmark, exiting non-zero if importing turtletranslate exceeds its budget, or if it loads the LLM
+client stack (which should only be imported once a model is actually queried).
+
+    python test/import_time.py [budget in ms]
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from turtletranslate.logger import logger
+
+BUDGET_MS = float(sys.argv[1] if len(sys.argv) > 1 else os.getenv("IMPORT_BUDGET_MS", 150))
+RUNS = 7
+MODULES = ["turtletranslate", "turtletranslate.scan", "turtletranslate.file_handler"]
+LAZY_MODULES = ["ollama", "httpx", "markupsafe"]
+
+MEASURE = """\
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import the module in a fresh interpreter, so nothing is cached in sys.modules."""
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)}
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(module=module)], capture_output=True, text=True, check=True, env=env
+    )
+    return json.loads(output.stdout)
+
+
+failed = False
+for module in MODULES:
+    runs = [measure(module) for _ in range(RUNS)]
+    best = min(run["ms"] for run in runs)
+    loaded = [name for name in LAZY_MODULES if name in runs[0]["modules"]]
+    logger.info(f"import {module}: best {best:.1f}ms of {RUNS} runs (budget {BUDGET_MS:.0f}ms)")
+    if best > BUDGET_MS:
+        logger.error(f"import {module} exceeded its budget: {best:.1f}ms > {BUDGET_MS:.0f}ms")
+        failed = True
+    if loaded:
+        logger.error(f"import {module} eagerly imported {', '.join(loaded)}")
+        failed = True
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,83 @@
+"""
+Benchmark of the attempts needed per section with and without critique-guided revision, against a fake client whose
+drafts are often flawed, and whose revisions usually fix the flaw the critic pointed out. Exits non-zero if revising
+does not lower the average number of attempts.
+
+    python test/revision_attempts.py [sections]
+"""
+
+import json
+import random
+import sys
+
+from fakes import FakeClient, quiet, translation, translator
+from turtletranslate.logger import logger
+
+SECTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+FLAWED_DRAFT = 0.6  # Chance a translation from scratch has a flaw
+FIXED_BY_REVISION = 0.85  # Chance a revision fixes the flaw in its critique
+FLAW = "[untranslated]"
+
+
+class RevisingClient(FakeClient):
+    """Translates with the flaws above, with a critic that rejects (and explains) flawed drafts."""
+
+    def __init__(self, seed: int):
+        super().__init__()
+        self.random = random.Random(seed)
+
+    def worker(self, prompt: str) -> str:
+        if "Rejected translation:\n" in prompt:
+            draft = prompt.split("Rejected translation:\n", 1)[1].rsplit("\n\nOnly respond", 1)[0]
+            fixed = self.random.random() < FIXED_BY_REVISION
+            return draft.replace(f" {FLAW}", "") if fixed else draft
+        flawed = self.random.random() < FLAWED_DRAFT
+        return super().worker(prompt) + (f" {FLAW}" if flawed else "")
+
+    def verdict(self, prompt: str) -> str:
+        return json.dumps({"approved": FLAW not in translation(prompt)})
+
+    def reason(self, prompt: str) -> str:
+        return json.dumps({"reason": f"A phrase was left untranslated: {FLAW}"})
+
+
+def document(sections: int) -> str:
+    words = "the quick translation of every section should read naturally in the target language".split()
+    rng = random.Random(0)
+    return "\n\n".join(f"## Section {i}\n\n" + " ".join(rng.choices(words, k=30)) + "." for i in range(sections))
+
+
+def run(revisions: int) -> dict:
+    client = RevisingClient(seed=1)
+    attempts = list()
+
+    def on_section(index: int, section: dict):
+        attempts.append(sum(turtle.tier_stats[token]["main"]["calls"] for token in turtle.tier_stats) - sum(attempts))
+
+    turtle = translator(client, document(SECTIONS), revisions=revisions, on_section=on_section)
+    turtle.translate()
+    attempts.sort()
+    return {
+        "mean": sum(attempts) / len(attempts),
+        "p90": attempts[int(len(attempts) * 0.9)],
+        "max": attempts[-1],
+        "requests": client.calls,
+    }
+
+
+def main() -> int:
+    with quiet():
+        results = {revisions: run(revisions) for revisions in (0, 2)}
+    for revisions, result in results.items():
+        logger.info(
+            f"revisions={revisions}: {result['mean']:.2f} attempts per section on average (p90 {result['p90']}, "
+            f"max {result['max']}), {result['requests']} requests for {SECTIONS} sections"
+        )
+    if results[2]["mean"] >= results[0]["mean"]:
+        logger.error("Revising rejected translations did not lower the number of attempts")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
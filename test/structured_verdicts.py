@@ -0,0 +1,127 @@
+"""
+Checks of the structured critic verdicts against a fake client: verdict parsing, a reason only being requested after
+a rejection, unparseable (i.e. cut off) verdicts counting as rejections, free-form text from a server without
+structured outputs being read as a free-form verdict, and the generated tokens saved compared to free-form verdicts, as
+counted in prompt_stats. Exits non-zero if any check fails.
+
+    python test/structured_verdicts.py [sections]
+"""
+
+import json
+import sys
+
+from fakes import FakeClient, document, quiet, translation, translator
+from turtletranslate import TurtleTranslator
+from turtletranslate.logger import logger
+from turtletranslate.translate import critic_verdict, parse_verdict
+
+SECTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+FLAW = "[untranslated]"
+FREE_FORM_APPROVAL = (
+    "YES. The translation is accurate, fluent and natural, and it preserves the markdown formatting. " * 2
+)
+FREE_FORM_REJECTION = f"NO. A phrase was left untranslated: {FLAW}. Translate it, and keep everything else as it is."
+
+PARSE_CASES = {
+    '{"approved": true}': True,
+    '{"approved": false}': False,
+    ' {"approved": false} ': False,
+    '{"approved": "no"}': None,
+    '{"reason": "too long"}': None,
+    '{"approv': None,  # Cut off by num_predict
+    "YES, the translation is fine": None,
+    "[true]": None,
+}
+
+
+class CriticClient(FakeClient):
+    """Flaws every other first draft, with a critic that rejects (and explains) flaws."""
+
+    def __init__(self, verdict: str = None):
+        super().__init__()
+        self.fixed_verdict = verdict  # Fixed critic response, i.e. a cut off verdict
+        self._drafts = 0
+
+    def worker(self, prompt: str) -> str:
+        self._drafts += 1
+        return super().worker(prompt) + (f" {FLAW}" if self._drafts % 2 else "")
+
+    def verdict(self, prompt: str) -> str:
+        if self.fixed_verdict is not None:
+            return self.fixed_verdict
+        return json.dumps({"approved": FLAW not in translation(prompt)})
+
+    def reason(self, prompt: str) -> str:
+        return json.dumps({"reason": f"A phrase was left untranslated: {FLAW}"})
+
+    def free_form(self, prompt: str) -> str:
+        return FREE_FORM_REJECTION if FLAW in translation(prompt) else FREE_FORM_APPROVAL
+
+
+def critic_translator(client: CriticClient, **options) -> TurtleTranslator:
+    return translator(client, document(SECTIONS), revisions=0, **options)
+
+
+def critic_eval_count(turtle: TurtleTranslator) -> int:
+    return sum(s["eval_count"] for token, s in turtle.prompt_stats.items() if token.startswith("translation_critic_"))
+
+
+def main() -> int:
+    failed = list()
+
+    for text, expected in PARSE_CASES.items():
+        if parse_verdict(text) is not expected:
+            failed.append(f"parse_verdict({text!r}) returned {parse_verdict(text)!r}, expected {expected!r}")
+
+    with quiet():
+        structured = CriticClient()
+        turtle = critic_translator(structured)
+        turtle.translate()
+        free_form = CriticClient()
+        free_turtle = critic_translator(free_form, structured_verdicts=False)
+        free_turtle.translate()
+
+        cut_off_turtle = critic_translator(CriticClient(verdict='{"appro'))
+        cut_off_turtle._section, cut_off_turtle._translated_section = "Some text", "NOE TEKST"
+        cut_off_verdict = critic_verdict(cut_off_turtle, "translation_critic_article")
+        unsupported_turtle = critic_translator(CriticClient(verdict="YES, the translation is accurate."))
+        unsupported_turtle._section, unsupported_turtle._translated_section = "Some text", "NOE TEKST"
+        unsupported_verdict = critic_verdict(unsupported_turtle, "translation_critic_article")
+
+    # Every other draft is flawed, so the first draft of every section is rejected once
+    rejections = len(structured.prompts["verdict"]) - len(turtle._sections)
+    if len(structured.prompts.get("reason", list())) != rejections:
+        failed.append(f"{len(structured.prompts.get('reason', list()))} reasons requested for {rejections} rejections")
+    if rejections <= 0:
+        failed.append("The critic never rejected a translation")
+    if critic_eval_count(turtle) != structured.eval_count["verdict"] + structured.eval_count["reason"]:
+        failed.append(
+            f"prompt_stats counted {critic_eval_count(turtle)} critic tokens, the client generated "
+            f"{structured.eval_count['verdict'] + structured.eval_count['reason']}"
+        )
+    if critic_eval_count(free_turtle) != free_form.eval_count["free_form"]:
+        failed.append(
+            f"prompt_stats counted {critic_eval_count(free_turtle)} critic tokens, the client generated "
+            f"{free_form.eval_count['free_form']}"
+        )
+    if cut_off_verdict != (False, ""):
+        failed.append(f"A cut off verdict returned {cut_off_verdict}, expected a rejection without a reason")
+    if unsupported_verdict != (True, ""):
+        failed.append(f"A free-form approval returned {unsupported_verdict}, expected an approval")
+
+    saved = 1 - critic_eval_count(turtle) / critic_eval_count(free_turtle)
+    logger.info(
+        f"Critics generated {critic_eval_count(turtle)} tokens with structured verdicts and "
+        f"{critic_eval_count(free_turtle)} with free-form verdicts ({saved:.0%} saved), "
+        f"{rejections} rejections for {SECTIONS} sections"
+    )
+    if saved <= 0:
+        failed.append("Structured verdicts did not save any generated tokens")
+
+    for failure in failed:
+        logger.error(failure)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Regression checks of table translation against a fake client: a German table of proper names, whose cells correctly
+stay the same, must be approved on the first attempt, and a table retried after a rejection must pass the critique to
+the translator instead of sending the same cells again. Exits non-zero if any check fails.
+
+    python test/table_cells.py
+"""
+
+import json
+import sys
+
+from fakes import FakeClient, quiet, translator
+from turtletranslate.exceptions import TurtleTranslateException
+from turtletranslate.logger import logger
+
+NAMES_TABLE = """\
+| Produkt | Hersteller |
+| --- | --- |
+| Kubernetes | Google |
+| Grafana | Grafana Labs |
+| API | SAP |"""
+CRITIQUE = "The header cells were left in German."
+
+
+class TableClient(FakeClient):
+    """Keeps every table cell as it is, with a critic that follows the notes of the automated checks."""
+
+    def __init__(self, rejections: int = 0):
+        super().__init__()
+        self.rejections = rejections  # Number of verdicts to reject regardless
+
+    def worker(self, prompt: str) -> str:
+        cells, _ = json.JSONDecoder().raw_decode(prompt.split("**Cells:**\n", 1)[1])
+        return json.dumps(cells, ensure_ascii=False)
+
+    def verdict(self, prompt: str) -> str:
+        rejected = self.rejections > 0 or "identical to the original" in prompt
+        self.rejections -= 1
+        return json.dumps({"approved": not rejected})
+
+    def reason(self, prompt: str) -> str:
+        return json.dumps({"reason": CRITIQUE})
+
+
+def translate(client: TableClient) -> str:
+    options = {"source_language": "German", "target_language": "English", "wrap_in_span": False, "_max_attempts": 5}
+    return translator(client, NAMES_TABLE, **options).translate()
+
+
+def main() -> int:
+    failed = list()
+    with quiet():
+        unchanged = TableClient()
+        try:
+            document = translate(unchanged)
+            if NAMES_TABLE not in document:
+                failed.append("The table of names was not kept as it is")
+        except TurtleTranslateException as e:
+            failed.append(f"The table of names failed to translate: {e}")
+        if len(unchanged.prompts["worker"]) != 1:
+            failed.append(f"The table of names took {len(unchanged.prompts['worker'])} attempts, expected 1")
+
+        retried = TableClient(rejections=1)
+        try:
+            translate(retried)
+        except TurtleTranslateException as e:
+            failed.append(f"The retried table failed to translate: {e}")
+        if len(retried.prompts["worker"]) != 2:
+            failed.append(f"The retried table took {len(retried.prompts['worker'])} attempts, expected 2")
+        elif CRITIQUE not in retried.prompts["worker"][1]:
+            failed.append("The critique was not passed to the translator when retrying the table")
+        elif CRITIQUE in retried.prompts["worker"][0]:
+            failed.append("The first attempt at the table was given a critique")
+
+    for failure in failed:
+        logger.error(failure)
+    if not failed:
+        logger.info("Table checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Check of the time saved reported for tiered translation on a known call mix: 10 fast calls of 1s approving 6 sections,
+and 8 main calls of 5s (4 escalations and 4 sections without a fast attempt). Exits non-zero if the report is off.
+
+    python test/tier_report.py
+"""
+
+import sys
+from types import SimpleNamespace
+
+from turtletranslate.logger import logger
+from turtletranslate.translate import tier_report
+
+TIER_STATS = {
+    "article": {
+        "fast": {"calls": 10, "approved": 6, "seconds": 10.0},
+        "main": {"calls": 8, "approved": 8, "seconds": 40.0},
+        "escalated": 4,
+    }
+}
+# The 6 approved sections would have cost 6 main calls (30s), and all 10 fast calls were paid for (10s)
+EXPECTED = {"fast_approved": 6, "escalated": 4, "escalation_rate": 0.4, "time_saved": 20.0}
+
+
+def main() -> int:
+    report = tier_report(SimpleNamespace(tier_stats=TIER_STATS))["article"]
+    if report != EXPECTED:
+        logger.error(f"Unexpected tier report {report}, expected {EXPECTED}")
+        return 1
+    logger.info(f"Tier report: {report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
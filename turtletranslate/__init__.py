@@ -1,15 +1,27 @@
+import fnmatch
 import os
 import re
 from dataclasses import dataclass
-
-import ollama
+from typing import TYPE_CHECKING, Callable
 
 from turtletranslate import file_handler
+from turtletranslate.cache import Cache, DEFAULT_CACHE
 from turtletranslate.file_handler import parse, load_translations_from_file
+from turtletranslate.glossary import Glossary
+from turtletranslate.journal import SectionJournal
+from turtletranslate.limiter import AdaptiveLimiter
 from turtletranslate.logger import logger
+from turtletranslate.similarity import SimilarityIndex, index_path
 from turtletranslate.tokens import NO_TRANSLATE_TOKEN
-from turtletranslate.translate import translate, generate_checksum
-from turtletranslate.validator import validate
+from turtletranslate import tracing
+from turtletranslate.runner import arun, gather
+from turtletranslate.translate import translate, _translate, generate_checksum, TRANSLATE_TYPES
+from turtletranslate.validator import validate, _validate
+
+if TYPE_CHECKING:
+    import asyncio
+
+    import ollama  # Imported by the client itself, so offline tasks (scans, checksums) never load the client stack
 
 TRANSLATABLE_FRONTMATTER_KEYS = [
     "title",
@@ -20,20 +32,46 @@ TRANSLATABLE_FRONTMATTER_KEYS = [
 
 @dataclass
 class TurtleTranslator:
-    client: ollama.Client
+    client: "ollama.Client"  # Or an ollama.AsyncClient for atranslate and avalidate_translations
     document: str
     model: str = "gemma3:27b-it-q4_K_M"
+    fast_model: str = None  # Smaller model to try first, escalating rejected sections to model (i.e. "gemma3:4b")
+    fast_model_attempts: int = 1  # Number of attempts with fast_model before escalating to model
     num_ctx: int = 6 * 1024
+    routes: dict = None  # Model, num_ctx and options per prompt type (or glob), i.e. {"*_critic_*": {"model": "x"}}
     source_language: str = "English"
     target_language: str = "Spanish"
     prepend_md: str = (
         ""  # Markdown to prepend to the translated document (i.e. "> NOTE: This is a machine generated translation.")
     )
+    summarize: bool = False  # Whether to generate a (map-reduce) summary of the document as context for translators
+    summary_workers: int = 4  # Number of document chunks to summarize concurrently
+    max_concurrency: int = 4  # Maximum number of requests in flight at once with the async API (atranslate)
+    limiter: AdaptiveLimiter = None  # Adapts the requests in flight to the latency, shared by translators (sync API)
     review: bool = True  # Whether to enable the review process (critique and revision)
+    revisions: int = 2  # Times in a row a rejected translation is revised with its critique before starting over
+    prefix_cache: bool = False  # Whether to lay out prompts (and order sections) to maximize Ollama prompt cache reuse
+    mask_spans: bool = False  # Whether to swap URLs, inline code, HTML and math for placeholders in worker prompts
+    glossary: Glossary = None  # Terms that must be translated consistently (a Glossary, or a {term: translation} dict)
+    prevalidate: bool = True  # Whether to run cheap rule-based checks (structure, URLs, length, script) before review
+    auto_approve_low_risk: bool = False  # Whether to approve short sections passing prevalidation without a critic
+    structured_verdicts: bool = False  # Whether critics answer with a constrained JSON verdict (needs format support)
     wrap_in_span: bool = True  # Whether to wrap each section in a span tag with data attributes for type and index
     target_filename: str = None  # Target filename for translation output and reuse
     write_file: bool = None  # Whether to write the output to a file (defaults to True if target_filename is provided)
+    return_document: bool = True  # Whether translate() returns the document (disable for huge documents)
     add_stats: bool = True  # Whether to add translation statistics to the frontmatter
+    journal: bool = True  # Whether to journal approved sections next to the target file, so crashed runs can resume
+    journal_fsync_every: int = 8  # Number of journaled sections to buffer before fsyncing the journal
+    cache: Cache = None  # Cache for summaries and prepends (LRUCache, DiskCache or NullCache), shared by default
+    reuse_index: dict = None  # Preloaded checksum -> translation index to reuse instead of reading target_filename
+    similarity_threshold: float = None  # Minimum similarity (0-1) to update a near-duplicate translation, None disables
+    similarity_index: SimilarityIndex = None  # Index of previous translations (loaded next to target_filename if None)
+    on_section: Callable = None  # Called with (index, section) as each section is translated or reused
+    reuse_stats: dict = None  # Number of sections reused exactly, reused after normalization, updated or translated
+    prompt_stats: dict = None  # Calls, prompt/eval token counts and durations reported by Ollama, per prompt type
+    tier_stats: dict = None  # Calls, approvals, time and escalations per model tier, per section type
+    written: bool = False  # Whether the target file was written (write errors are logged, not raised)
     _max_attempts: int = 100  # Maximum number of attempts to make before giving up on a translation
     _sections: list[dict[str, str]] = list
     _section: dict[str, str] = dict
@@ -45,8 +83,21 @@ class TurtleTranslator:
     _translated_frontmatter: dict = dict
     _critique: str = ""  # The last critique given by the reviewer worker
     _existing_sections: dict = None  # Dictionary to store existing translated sections by checksum
+    _journal: SectionJournal = None  # Journal of approved sections for the current run
+    _previous_section: str = ""  # The source of a near-duplicate section being updated
+    _previous_translation: str = ""  # The translation of a near-duplicate section being updated
+    _mask_problems: list = None  # Placeholders the last masked worker response lost or duplicated
+    _similarity_target: tuple = None  # The (target_language, target_filename) similarity_index was built for
 
     def __post_init__(self):
+        if self.cache is None:
+            self.cache = DEFAULT_CACHE
+        if isinstance(self.glossary, dict):
+            self.glossary = Glossary(self.glossary)
+        self.prompt_stats = dict()
+        for pattern in self.routes or dict():
+            if not any(fnmatch.fnmatchcase(token, pattern) for token in TRANSLATE_TYPES):
+                logger.warning(f"Route {pattern} does not match any prompt type")
         self._original_frontmatter, self._sections = file_handler.parse(self.document, prepend_md=self.prepend_md)
         self.frontmatter = self._original_frontmatter
 
@@ -76,6 +127,8 @@ class TurtleTranslator:
             "summary": self._summary,
             "frontmatter": self.frontmatter,
             "critique": self._critique,
+            "previous_section": self._previous_section,
+            "previous_translation": self._previous_translation,
         }
 
     @property
@@ -95,16 +148,60 @@ class TurtleTranslator:
         self._translated_frontmatter = value
 
     def translate(self):
+        with tracing.span("translate", language=self.target_language, target=str(self.target_filename)):
+            self._prepare()
+            try:
+                return translate(self)
+            finally:
+                if self._journal:
+                    self._journal.close()
+
+    async def atranslate(self, limiter: "asyncio.Semaphore" = None):
+        """
+        Translate the document with an ollama.AsyncClient (client), without blocking the event loop.
+
+        At most max_concurrency requests are in flight at once, unless a limiter shared between documents is given.
+        Cancelling the task cancels the in-flight request, and closes the journal like a crashed run.
+        """
+        import asyncio
+
+        with tracing.span("translate", language=self.target_language, target=str(self.target_filename)):
+            self._prepare()
+            try:
+                return await arun(self, _translate(self), limiter or asyncio.Semaphore(self.max_concurrency))
+            finally:
+                if self._journal:
+                    self._journal.close()
+
+    def _prepare(self):
+        self.prompt_stats = dict()
+
         # Set write_file default if not explicitly set
         if self.write_file is None:
             self.write_file = self.target_filename is not None
 
-        # Load existing translations if target file exists
+        # Load existing translations if target file exists, unless a reuse index is already kept in memory
         self._existing_sections = dict()
-        if self.target_filename and os.path.exists(self.target_filename):
+        if self.reuse_index is not None:
+            self._existing_sections.update(self.reuse_index)
+        elif self.target_filename and os.path.exists(self.target_filename):
             self._load_existing_translations()
 
-        return translate(self)
+        # Load the index of previous translations, to find near-duplicates of edited sections. The index of another
+        # target (i.e. when the same instance translates to another language) is dropped, and never queried
+        target = (self.target_language, self.target_filename)
+        if self._similarity_target not in (None, target):
+            self.similarity_index = None
+        self._similarity_target = target
+        if self.similarity_threshold is not None and self.similarity_index is None and self.target_filename:
+            if os.path.exists(index_path(self.target_filename)):
+                self.similarity_index = SimilarityIndex.load(index_path(self.target_filename))
+
+        # Recover sections approved by a previous (crashed) run, and journal new ones as they are approved
+        self._journal = None
+        if self.journal and self.write_file and self.target_filename:
+            self._journal = SectionJournal(self.target_filename, fsync_every=self.journal_fsync_every)
+            self._existing_sections.update(self._journal.load())
 
     def get_translation_tuples(self) -> dict:
         """
@@ -181,6 +278,26 @@ class TurtleTranslator:
         except Exception as e:
             logger.error(f"Failed to remove checksums: {e}")
 
+    async def avalidate_translations(self, invalidate_checksums=True, limiter: "asyncio.Semaphore" = None) -> dict:
+        """Async version of validate_translations, validating up to max_concurrency sections concurrently."""
+        import asyncio
+
+        limiter = limiter or asyncio.Semaphore(self.max_concurrency)
+        tuples = self.get_translation_tuples()
+        verdicts = await gather(
+            *(
+                arun(self, _validate(self, org, translated, section_type), limiter)
+                for org, translated, section_type in tuples.values()
+            )
+        )
+        results = {
+            "passed": [checksum for checksum, passed in zip(tuples, verdicts) if passed],
+            "failed": [checksum for checksum, passed in zip(tuples, verdicts) if not passed],
+        }
+        if invalidate_checksums and results["failed"]:
+            self.remove_failed_translation_checksums(results["failed"])
+        return results
+
     def validate_translations(self, invalidate_checksums=True) -> dict[str, list]:
         """Iterate through all translation pairs, run validation, and return a summary of results."""
         results = {
@@ -203,19 +320,30 @@ class TurtleTranslator:
         return results
 
     def write_translated_document(self, extra_frontmatter: dict = None) -> str:
-        """Write the translated document to the target file if write_file is True."""
-        translated_content = self.reconstruct_translated_document(extra_frontmatter=extra_frontmatter)
+        """
+        Stream the translated document to the target file if write_file is True (through a temporary file, which is
+        atomically renamed), and return it as a string unless return_document is False.
+        """
+        frontmatter = {**self.translated_frontmatter, **(extra_frontmatter or dict())}
 
         if self.write_file and self.target_filename:
             try:
-                os.makedirs(os.path.dirname(os.path.abspath(self.target_filename)), exist_ok=True)
-                with open(self.target_filename, "w", encoding="utf-8") as f:
-                    f.write(translated_content)
+                with tracing.span("write", path=str(self.target_filename)):
+                    file_handler.save_document(
+                        self.target_filename, frontmatter, self._translated_sections, wrap_in_span=self.wrap_in_span
+                    )
                 logger.info(f"Translated document written to {self.target_filename}")
+                self.written = True
+                if self._journal:
+                    self._journal.discard()
+                if self.similarity_threshold is not None and self.similarity_index is not None:
+                    self.similarity_index.save(index_path(self.target_filename))
             except Exception as e:
                 logger.error(f"Failed to write translated document: {e}")
 
-        return translated_content
+        if self.return_document:
+            with tracing.span("reconstruct"):
+                return self.reconstruct_translated_document(extra_frontmatter=extra_frontmatter)
 
 
 def _retroactively_update_checksums(source_document: str, target_document: str, output_file: str = None) -> str:
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from turtletranslate.logger import logger
+
+
+class Cache:
+    """
+    Minimal cache interface used for summaries, prepends and other generated content.
+
+    Values must be JSON serializable (strings, lists and dictionaries), so any backend can store them.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return self._get(key) is not None
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        self.set(key, value)
+
+    def set(self, key: str, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class NullCache(Cache):
+    """A cache that never stores anything, i.e. to always regenerate content."""
+
+    def _get(self, key: str):
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(Cache):
+    """In-memory LRU cache bounded by number of items and/or (approximate) size in bytes."""
+
+    def __init__(self, max_items: int = 1024, max_bytes: int = None):
+        super().__init__()
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(key: str, value) -> int:
+        return len(key) + len(json.dumps(value, ensure_ascii=False))
+
+    def _get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def set(self, key: str, value):
+        size = self._sizeof(key, value)
+        with self._lock:
+            if key in self._items:
+                self.size_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size_bytes += size
+            while self._items and (
+                (self.max_items is not None and len(self._items) > self.max_items)
+                or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def stats(self) -> dict:
+        return {**super().stats, "items": len(self._items), "bytes": self.size_bytes}
+
+
+class DiskCache(Cache):
+    """On-disk cache storing each entry as a JSON file in a directory, so cached content survives restarts."""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()[:32]}.json")
+
+    def _get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable cache entry for {key}: {e}")
+            return None
+        return entry["value"] if entry.get("key") == key else None
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def clear(self):
+        for fn in os.listdir(self.directory):
+            if fn.endswith(".json"):
+                os.remove(os.path.join(self.directory, fn))
+
+    @property
+    def stats(self) -> dict:
+        return {**super().stats, "directory": self.directory}
+
+
+# Shared by every TurtleTranslator that does not specify its own cache
+DEFAULT_CACHE = LRUCache(max_items=1024, max_bytes=64 * 1024 * 1024)
@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+from turtletranslate.logger import logger
+
+# The parts of a generate request that determine its response, and the response fields kept in a cassette
+REQUEST_FIELDS = ("model", "system", "prompt", "options", "format")
+RESPONSE_FIELDS = (
+    "response",
+    "done",
+    "done_reason",
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+class ReplayMiss(LookupError):
+    """Raised by a ReplayClient for a request that is not in its cassette."""
+
+
+class CassetteResponse:
+    """A replayed generate response, with the attributes (and keys) of an ollama.GenerateResponse the pipeline uses."""
+
+    def __init__(self, fields: dict):
+        self.__dict__.update(dict.fromkeys(RESPONSE_FIELDS), **fields)
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+
+def request_key(request: dict) -> str:
+    """Hash of the fields of a generate request that determine its response."""
+    fields = {field: request.get(field) for field in REQUEST_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:32]
+
+
+def _open(path: str):
+    """Cassettes are JSON lines, gzip compressed if the path ends with .gz."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _read_lines(path: str) -> list[str]:
+    """
+    Read the lines of a cassette. A cassette of a crashed run may end in a torn gzip member, so everything that could
+    be decompressed before it is kept.
+    """
+    lines = list()
+    try:
+        with _open(path) as f:
+            for line in f:
+                lines.append(line)
+    except (EOFError, gzip.BadGzipFile, zlib.error, UnicodeDecodeError) as e:
+        logger.warning(f"{path} is truncated (i.e. recorded by a crashed run), reading what was recorded: {e}")
+    return lines
+
+
+class RecordingClient:
+    """
+    Wrap a client, appending every generate request and its response to a cassette file (JSON lines). Everything but
+    generate is passed through to the wrapped client. Compressed cassettes get a complete gzip member per record, so
+    the cassette of a crashed run stays readable, and can be appended to by the next run.
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = str(path)
+        self._compress = self.path.endswith(".gz")
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+        if not self._compress and self._file.tell():
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")  # Keep the records of this run off the line torn by a crashed run
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def generate(self, **request):
+        response = self.client.generate(**request)
+        record = {
+            "key": request_key(request),
+            "request": {field: request.get(field) for field in REQUEST_FIELDS},
+            "response": {field: getattr(response, field, None) for field in RESPONSE_FIELDS},
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode()
+        with self._lock:
+            self._file.write(gzip.compress(line) if self._compress else line)
+            self._file.flush()  # A crashed run keeps every response it paid for
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ReplayClient:
+    """
+    Serve generate responses from a cassette recorded by RecordingClient, matched by request hash, so a run can be
+    reproduced offline. A request recorded several times (i.e. retries) gets its responses in the recorded order, and
+    the last one once they are used up.
+    """
+
+    def __init__(self, path: str, latency: float = 0.0, time_scale: float = 0.0, fallback=None):
+        """
+        :param path: Path to the cassette.
+        :param latency: Seconds to wait before every response.
+        :param time_scale: Fraction of the recorded duration of each response to wait, i.e. 1.0 replays in real time.
+        :param fallback: Client to query for requests missing from the cassette, ReplayMiss is raised if None.
+        """
+        self.path = str(path)
+        self.latency = latency
+        self.time_scale = time_scale
+        self.fallback = fallback
+        self.hits, self.misses = 0, 0
+        self._responses = dict()  # Request key -> responses not replayed yet
+        self._last = dict()  # Request key -> last response replayed
+        self._lock = threading.Lock()
+        torn = 0
+        for line in _read_lines(self.path):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                torn += 1  # Cut off by a crashed run
+                continue
+            self._responses.setdefault(record["key"], deque()).append(record["response"])
+        if torn:
+            logger.warning(f"Ignored {torn} incomplete records in {self.path}")
+        logger.info(f"Loaded {sum(map(len, self._responses.values()))} responses from {self.path}")
+
+    def show(self, model: str) -> dict:
+        return dict()
+
+    def pull(self, model: str) -> dict:
+        return dict()
+
+    def generate(self, **request) -> CassetteResponse:
+        key = request_key(request)
+        with self._lock:
+            responses = self._responses.get(key)
+            if responses:
+                self._last[key] = responses.popleft()
+            fields = self._last.get(key)
+            if fields is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if fields is None:
+            if self.fallback is None:
+                raise ReplayMiss(f"No recorded response for {request.get('model')}: {request.get('prompt', '')[:80]!r}")
+            return self.fallback.generate(**request)
+
+        delay = self.latency + self.time_scale * (fields.get("total_duration") or 0) / 1e9
+        if delay > 0:
+            time.sleep(delay)
+        return CassetteResponse(fields)
@@ -0,0 +1,380 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import timeit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from turtletranslate import TurtleTranslator
+from turtletranslate.cassette import RecordingClient, ReplayClient
+from turtletranslate.exceptions import TurtleTranslateException
+from turtletranslate.glossary import Glossary
+from turtletranslate.jobqueue import JobQueue, run_workers
+from turtletranslate.limiter import AdaptiveLimiter
+from turtletranslate import tracing
+from turtletranslate.logger import logger
+from turtletranslate.scan import scan, write_plan, load_plan, source_frontmatter_checksum
+from turtletranslate.watch import Watcher
+
+DEFAULT_OUTPUT = "translated/{language}/{relpath}"
+DEFAULT_MANIFEST = "turtletranslate-manifest.json"
+
+
+def hash_file(path: Path) -> str:
+    """Hash a source document in chunks, without decoding it."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def output_path(template: str, source_dir: Path, source: Path, language: str) -> Path:
+    """
+    Format the output path template for a source document and target language.
+
+    Available placeholders: {language}, {relpath} (i.e. guide/intro.md), {reldir} (i.e. guide), {stem} (i.e. intro),
+    and {suffix} (i.e. .md).
+    """
+    rel = source.relative_to(source_dir)
+    return Path(
+        template.format(
+            language=language,
+            relpath=rel.as_posix(),
+            reldir=rel.parent.as_posix(),
+            stem=rel.stem,
+            suffix=rel.suffix,
+        )
+    )
+
+
+class Manifest:
+    """
+    Source hashes per output file, so unchanged documents can be skipped on the next run. Recorded outputs are saved
+    at most every save_interval seconds, call save() once more when the run ends.
+    """
+
+    def __init__(self, path: Path, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved = timeit.default_timer()
+        self.entries = dict()
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    def is_fresh(self, source: Path, output: Path, model: str) -> bool:
+        """Whether the output is up to date, checking size and mtime before falling back to hashing the source."""
+        entry = self.entries.get(output.as_posix())
+        if not entry or entry.get("model") != model or not output.exists():
+            return False
+        stat = source.stat()
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return True
+        return entry.get("sha256") == hash_file(source)
+
+    def record(self, source: Path, output: Path, model: str):
+        stat = source.stat()
+        entry = {
+            "source": source.as_posix(),
+            "sha256": hash_file(source),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "model": model,
+            "frontmatter": source_frontmatter_checksum(source),  # For scans of outputs written without stats
+        }
+        with self._lock:
+            self.entries[output.as_posix()] = entry
+            self._dirty = True
+            if timeit.default_timer() - self._saved >= self.save_interval:
+                self._save()
+
+    def save(self):
+        """Write the manifest if outputs were recorded since it was last saved."""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        """Write the manifest atomically, so an interrupted run never leaves it half written."""
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._saved = timeit.default_timer()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="turtletranslate",
+        description="Translate a tree of markdown documents using Ollama.",
+    )
+    parser.add_argument("source", type=Path, help="Directory containing the source markdown documents")
+    parser.add_argument(
+        "-l", "--language", dest="languages", action="append", required=True, help="Target language (repeatable)"
+    )
+    parser.add_argument("-s", "--source-language", default="English", help="Language of the source documents")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=DEFAULT_OUTPUT,
+        help=f"Output path template, using {{language}}, {{relpath}}, {{reldir}}, {{stem}} and {{suffix}} "
+        f"(default: {DEFAULT_OUTPUT})",
+    )
+    parser.add_argument("-g", "--glob", default="**/*.md", help="Glob pattern for source documents (default: **/*.md)")
+    parser.add_argument("-m", "--model", default="gemma3:27b-it-q4_K_M", help="Ollama model to use")
+    parser.add_argument("--fast-model", help="Smaller model to try first, escalating rejected sections to --model")
+    parser.add_argument(
+        "--route",
+        dest="routes",
+        action="append",
+        default=[],
+        metavar="TYPE=MODEL",
+        help="Route a prompt type or glob to another model, i.e. 'translation_critic_*=gemma3:4b' (repeatable)",
+    )
+    parser.add_argument("--num-ctx", type=int, default=6 * 1024, help="Context size for the model")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_SERVER", "127.0.0.1"), help="Ollama server")
+    parser.add_argument("--prepend", default="", help="Markdown to prepend to every translated document")
+    parser.add_argument("--glossary", help="Glossary of required term translations (JSON object, or CSV/TSV file)")
+    parser.add_argument("--summarize", action="store_true", help="Give translators a summary of each document")
+    parser.add_argument("--no-review", action="store_true", help="Disable the critic review of each section")
+    parser.add_argument(
+        "--revisions",
+        type=int,
+        default=2,
+        help="Times a rejected translation is revised with its critique before starting over (default: 2, 0 disables)",
+    )
+    parser.add_argument(
+        "--prefix-cache", action="store_true", help="Lay out prompts to maximize reuse of the server's prompt cache"
+    )
+    parser.add_argument(
+        "--mask", action="store_true", help="Swap URLs, inline code, HTML and math for placeholders in worker prompts"
+    )
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        metavar="THRESHOLD",
+        help="Update translations of near-duplicate sections at or above this similarity (0-1), i.e. 0.8",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=2, help="Number of documents to translate concurrently")
+    parser.add_argument("--trace", metavar="PATH", help="Write a Chrome trace of the pipeline stages to PATH (JSON)")
+    parser.add_argument("--record", metavar="PATH", help="Record every model request and response to a cassette file")
+    parser.add_argument(
+        "--replay", metavar="PATH", help="Replay the responses of a cassette instead of querying Ollama"
+    )
+    parser.add_argument(
+        "--replay-latency", type=float, default=0.0, help="Seconds to wait before every replayed response (default: 0)"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adapt the number of requests in flight to the observed latency (use with a high -j, i.e. -j 16)",
+    )
+    parser.add_argument("--manifest", type=Path, default=Path(DEFAULT_MANIFEST), help="Path to the manifest file")
+    parser.add_argument("-f", "--force", action="store_true", help="Translate documents even if they are unchanged")
+    parser.add_argument(
+        "--scan", metavar="PLAN", type=Path, help="Scan for stale translations, write a work plan to PLAN and exit"
+    )
+    parser.add_argument("--plan", type=Path, help="Only translate the stale documents listed in a work plan")
+    parser.add_argument(
+        "--queue",
+        type=Path,
+        help="Run the jobs from a durable SQLite queue with -j worker processes, resuming it if it already exists",
+    )
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per document in queue mode (default: 3)")
+    parser.add_argument(
+        "-w", "--watch", action="store_true", help="Keep watching the source directory and retranslate edited documents"
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between each poll in watch mode")
+    return parser
+
+
+def _translator_options(client, args) -> dict:
+    return {
+        "client": client,
+        "model": args.model,
+        "fast_model": args.fast_model,
+        "routes": {pattern: {"model": model} for pattern, model in (route.split("=", 1) for route in args.routes)},
+        "num_ctx": args.num_ctx,
+        "source_language": args.source_language,
+        "prepend_md": args.prepend,
+        "review": not args.no_review,
+        "revisions": args.revisions,
+        "prefix_cache": args.prefix_cache,
+        "mask_spans": args.mask,
+        "glossary": args.glossary,
+        "summarize": args.summarize,
+        "similarity_threshold": args.similarity,
+        "return_document": False,
+        "limiter": args.limiter,
+    }
+
+
+def _translate_job(client, args, source: Path, output: Path, language: str):
+    turtle = TurtleTranslator(
+        **_translator_options(client, args),
+        document=source.read_text(encoding="utf-8"),
+        target_language=language,
+        target_filename=str(output),
+    )
+    turtle.translate()
+    if not turtle.written:
+        raise TurtleTranslateException(f"Could not write {output}")  # The error itself is logged by the translator
+
+
+def _run_queue(args, jobs: list[tuple[Path, Path, str]], manifest: Manifest, skipped: int) -> int:
+    """Translate the jobs with worker processes pulling from a durable queue, so an interrupted run can resume."""
+    queue = JobQueue(args.queue)
+    try:
+        for source, output, language in jobs:
+            queue.add(
+                source,
+                output,
+                language,
+                version=hash_file(source),
+                size=source.stat().st_size,
+                max_attempts=args.max_attempts,
+                force=args.force,
+            )
+    finally:
+        queue.close()
+
+    # The client and the limiter are per process
+    options = {key: value for key, value in _translator_options(None, args).items() if key not in ("client", "limiter")}
+    time = timeit.default_timer()
+    stats = run_workers(args.queue, args.host, options, processes=args.workers)
+
+    queue = JobQueue(args.queue)
+    try:
+        done = {(Path(source), Path(target)) for source, target, _, _ in queue.jobs("done")}
+        failed = queue.jobs("failed")
+    finally:
+        queue.close()
+    for source, output, _ in jobs:
+        if (source, output) in done:
+            manifest.record(source, output, args.model)
+    manifest.save()
+    logger.info(
+        f"Queue drained in {timeit.default_timer() - time:.2f}s: {stats['done']} done, {stats['failed']} failed "
+        f"({skipped} unchanged)"
+    )
+    for source, _, language, error in failed:
+        logger.error(f"Did not finish {source} ({language}): {error}")
+    return 1 if failed else 0
+
+
+def _run(args, client) -> int:
+    """Translate the stale documents (and keep watching the source directory with --watch)."""
+    if args.glossary:
+        args.glossary = Glossary.load(args.glossary)  # Compiled once, and shared by every document
+    args.limiter = AdaptiveLimiter(max_limit=max(1, args.workers) * 2) if args.adaptive else None
+    manifest = Manifest(args.manifest)
+
+    jobs, skipped = list(), 0
+    if args.plan:
+        jobs = [(Path(p["source"]), Path(p["target"]), p["language"]) for p in load_plan(args.plan)]
+    else:
+        for source in sorted(p for p in args.source.glob(args.glob) if p.is_file()):
+            for language in args.languages:
+                output = output_path(args.output, args.source, source, language)
+                if not args.force and manifest.is_fresh(source, output, args.model):
+                    skipped += 1
+                    continue
+                jobs.append((source, output, language))
+    logger.info(f"{len(jobs)} documents to translate, {skipped} unchanged")
+
+    if args.queue:
+        return _run_queue(args, jobs, manifest, skipped)
+
+    if args.trace:
+        tracing.enable()
+    failed = list()
+    time = timeit.default_timer()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {pool.submit(_translate_job, client, args, *job): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                source, output, language = futures[future]
+                try:
+                    future.result()
+                    manifest.record(source, output, args.model)
+                    logger.info(f"\033[33m[{done}/{len(jobs)}]\033[0m {source} -> {output}")
+                except Exception as e:
+                    failed.append((source, language, e))
+                    logger.error(f"\033[33m[{done}/{len(jobs)}]\033[0m {source} ({language}) failed: {e}")
+    finally:
+        manifest.save()  # Also keeps the outputs finished before an interruption
+
+    logger.info(
+        f"Translated {len(jobs) - len(failed)}/{len(jobs)} documents in {timeit.default_timer() - time:.2f}s "
+        f"({skipped} unchanged, {len(failed)} failed)"
+    )
+    for source, language, e in failed:
+        logger.error(f"Did not finish {source} ({language}): {e}")
+    if args.limiter:
+        stats = args.limiter.stats()
+        logger.info(
+            f"Adaptive concurrency limit {stats['limit']}, "
+            f"{stats['tokens_per_second']:.1f} tokens/s ({stats['requests_per_second']:.2f} requests/s)"
+        )
+    if args.trace:
+        tracing.disable().save(args.trace)
+        logger.info(f"Trace written to {args.trace} (open it in chrome://tracing or https://ui.perfetto.dev)")
+
+    if args.watch:
+        Watcher(
+            args.source,
+            lambda source: [(output_path(args.output, args.source, source, lang), lang) for lang in args.languages],
+            _translator_options(client, args),
+            glob=args.glob,
+            interval=args.interval,
+        ).run()
+    return 1 if failed else 0
+
+
+def main(argv: list[str] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    if not args.source.is_dir():
+        logger.error(f"Source directory {args.source} does not exist")
+        return 2
+    if args.queue and (args.record or args.replay):
+        logger.error("--record and --replay are not supported with --queue")  # Workers have their own clients
+        return 2
+
+    if args.scan:
+        pairs = [
+            (source, output_path(args.output, args.source, source, language), language)
+            for source in sorted(p for p in args.source.glob(args.glob) if p.is_file())
+            for language in args.languages
+        ]
+        checksums = {output: entry.get("frontmatter") for output, entry in Manifest(args.manifest).entries.items()}
+        write_plan(
+            args.scan, scan(pairs, prepend_md=args.prepend, workers=args.workers, frontmatter_checksums=checksums)
+        )
+        return 0
+
+    import ollama  # Not needed for scans
+
+    client = ollama.Client(args.host)
+    if args.replay:
+        client = ReplayClient(args.replay, latency=args.replay_latency)
+    elif args.record:
+        client = RecordingClient(client, args.record)
+    try:
+        return _run(args, client)
+    finally:
+        if isinstance(client, RecordingClient):
+            client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
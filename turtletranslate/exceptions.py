@@ -1 +1 @@
-class TurtleTranslateException(BaseException): ...
+class TurtleTranslateException(Exception): ...
@@ -1,25 +1,39 @@
+import io
 import logging
+import os
 import re
 from functools import lru_cache
 
 import yaml
 
 from turtletranslate.logger import logger
+from turtletranslate import tracing
 from turtletranslate.tokens import TOKENS, NO_TRANSLATE_TOKEN, DEFAULT_TOKEN, PREPEND_TOKEN, TOKENS_CH_LEN
-from typing import Dict
+from typing import Dict, TextIO
+
+# Use the libyaml C loader and dumper when PyYAML was built with them
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
 
 # The blockquote syntax captures content until there is a newline that is not followed by a blockquote symbol
 # Captures both callouts and blockquotes
 BLOCKQUOTE_SYNTAX = r"[^\S\r\n]*(?:> ?)([^\n]*(?:\n[ \t>][^\n]*)*)"
+# A pipe table is a header row, a delimiter row (i.e. "| --- | :---: |"), and every following row starting with a pipe
+TABLE_SYNTAX = r"\|[^\n]*\n\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*(?:\n\|[^\n]*)*"
 DELIMITERS = "|".join(
     [
         r"#{1,6}\s",  # Headers
         r"`{3}(?:\n|.)+?`{3}",  # Code fences
         BLOCKQUOTE_SYNTAX,  # Callouts and blockquotes
+        TABLE_SYNTAX,  # Tables
         # These are commented out because they can cause extra hallucinations in the translation, omitting them for now
         # r"={3}\s",  # Content blocks  # Not a problem so far, but might give inconsistent spacing
     ]
 )
+# Parsed documents kept in memory, a document is parsed again when it is translated, validated and scanned
+PARSE_CACHE_SIZE = 32
 
 
 # TODO: Adding sections to a dictionary with the section type as the key, and the section as the value, would
@@ -45,7 +59,7 @@ def _get_frontmatter(markdown: str) -> dict:
     """Get the frontmatter from a markdown string as a dictionary."""
     frontmatter = {}
     if markdown.startswith("---\n"):
-        frontmatter = yaml.safe_load(markdown.split("---\n")[1])
+        frontmatter = yaml.load(markdown.split("---\n")[1], Loader=YamlLoader)
     return frontmatter
 
 
@@ -71,9 +85,10 @@ def _cleanup_sections(sections: list[str]) -> list[str]:
         # If it matches the callout syntax, we should skip the next section, as it gets captured in the callout itself
         elif callout_regex.match(section):
             merged_sections.append(section)
-            logger.debug("Removing section after callout")
-            logger.debug("Keeping: " + section.replace("\n", "\\n"))
-            logger.debug("Removing: " + sections[i + 1].replace("\n", "\\n"))
+            if logger.level == logging.DEBUG:
+                logger.debug("Removing section after callout")
+                logger.debug("Keeping: " + section.replace("\n", "\\n"))
+                logger.debug("Removing: " + sections[i + 1].replace("\n", "\\n"))
             sections.pop(i + 1)  # Remove the next section, as it is already captured in the callout
         else:
             merged_sections.append(section)
@@ -108,7 +123,7 @@ def _get_sections(markdown: str) -> list[dict[str, str]]:
     return sections
 
 
-@lru_cache
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse(markdown: str, prepend_md: str = "") -> tuple[dict, list[dict[str, str]]]:
     """
     Parse a markdown string into frontmatter and sections.
@@ -116,8 +131,9 @@ def parse(markdown: str, prepend_md: str = "") -> tuple[dict, list[dict[str, str
     :param prepend_md: Text to prepend at the beginning of the text, i.e. "> NOTE: This is a machine generated translation."
     :return: A tuple containing the frontmatter and sections.
     """
-    frontmatter = _get_frontmatter(markdown)
-    sections = _get_sections(markdown)
+    with tracing.span("parse", characters=len(markdown)):
+        frontmatter = _get_frontmatter(markdown)
+        sections = _get_sections(markdown)
     if prepend_md:
         sections.insert(0, {PREPEND_TOKEN: prepend_md.strip()})
     if logger.level == logging.DEBUG:
@@ -128,25 +144,56 @@ def parse(markdown: str, prepend_md: str = "") -> tuple[dict, list[dict[str, str
     return frontmatter, sections
 
 
+def _wrap_span(index: int, section: dict[str, str]) -> str:
+    k, v = list(section.items())[0]
+    return (
+        f'<span class="turtletranslate-section" '
+        f'data-turtletranslate-type="{k}" '
+        f'data-turtletranslate-index="{index}" '
+        f'data-turtletranslate-checksum="{section["checksum"]}"'
+        f">\n\n{v}\n\n</span>"
+    )
+
+
 def wrap_span_around_sections(sections: list[dict[str, str]]) -> list[dict[str, str]]:
     """
     Wrap a span tag around each section in a list of sections.
     :param sections: The sections list.
     :return: The sections list with the span wrapped around the text.
     """
-    new_sections = list()
+    return [{list(section.keys())[0]: _wrap_span(i, section)} for i, section in enumerate(sections)]
+
+
+def write_document(f: TextIO, frontmatter: dict, sections: list[dict[str, str]], wrap_in_span: bool = True):
+    """
+    Stream a markdown document to a file handle, one section at a time, without building the whole document in memory.
+    :param f: A text file handle (or any object with a write method, i.e. io.StringIO).
+    :param frontmatter: The frontmatter dictionary.
+    :param sections: The sections list.
+    :param wrap_in_span: Whether to wrap a span tag around each section, with data attributes for type and index.
+    """
+    frontmatter_str = yaml.dump(frontmatter, Dumper=YamlDumper, default_flow_style=False)
+    if frontmatter_str.strip() == "{}":
+        frontmatter_str = ""
+    f.write(f"---\n{frontmatter_str}---\n\n")
     for i, section in enumerate(sections):
-        k, v = list(section.items())[0]
-        new_sections.append(
-            {
-                k: f'<span class="turtletranslate-section" '
-                f'data-turtletranslate-type="{k}" '
-                f'data-turtletranslate-index="{i}" '
-                f'data-turtletranslate-checksum="{section["checksum"]}"'
-                f">\n\n{v}\n\n</span>"
-            }
-        )
-    return new_sections
+        if i:
+            f.write("\n\n")
+        f.write(_wrap_span(i, section) if wrap_in_span else list(section.values())[0])
+
+
+def save_document(path: str, frontmatter: dict, sections: list[dict[str, str]], wrap_in_span: bool = True):
+    """Stream a markdown document to a temporary file next to path, then atomically replace path with it."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            write_document(f, frontmatter, sections, wrap_in_span=wrap_in_span)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
 
 def reconstruct(frontmatter: dict, sections: list[dict[str, str]], wrap_in_span: bool = True) -> str:
@@ -157,13 +204,9 @@ def reconstruct(frontmatter: dict, sections: list[dict[str, str]], wrap_in_span:
     :param wrap_in_span: Whether to wrap a span tag around each section, with data attributes for type and index.
     :return: The reconstructed markdown string.
     """
-    frontmatter_str = yaml.dump(frontmatter, default_flow_style=False)
-    if frontmatter_str.strip() == "{}":
-        frontmatter_str = ""
-    if wrap_in_span:
-        sections = wrap_span_around_sections(sections)
-    sections_str = "\n\n".join([list(s.values())[0] for s in sections])
-    return f"---\n{frontmatter_str}---\n\n{sections_str}"
+    buffer = io.StringIO()
+    write_document(buffer, frontmatter, sections, wrap_in_span=wrap_in_span)
+    return buffer.getvalue()
 
 
 # Find any <span ...> that (a) has class including turtletranslate-section and
@@ -187,30 +230,75 @@ def load_translations_from_file(file_path: str) -> Dict[str, str]:
     within that window. Preserves inner content verbatim.
     """
     translations: Dict[str, str] = {}
+    with tracing.span("load_translations", path=str(file_path)):
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+
+            starts = list(START_RE.finditer(content))
+            for i, m in enumerate(starts):
+                checksum = m.group(1)
+                section_start = m.end()
+                boundary = starts[i + 1].start() if i + 1 < len(starts) else len(content)
+                window = content[section_start:boundary]
+
+                # Find the last </span> before the boundary, if any.
+                last_close = None
+                for close in CLOSE_RE.finditer(window):
+                    last_close = close
+                if last_close is not None:
+                    section_content = window[: last_close.start()]
+                else:
+                    # No closing tag before next wrapper/EOF; take everything.
+                    section_content = window
+
+                translations[checksum] = section_content.strip()
+
+        except Exception as e:
+            logger.warning(f"Failed to load translations from {file_path}: {e}")
+
+    return translations
+
+
+def load_frontmatter_from_file(file_path: str) -> dict:
+    """Read only the frontmatter of a translated document. Empty if it has none, or the file could not be read."""
+    lines = list()
     try:
         with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        starts = list(START_RE.finditer(content))
-        for i, m in enumerate(starts):
-            checksum = m.group(1)
-            section_start = m.end()
-            boundary = starts[i + 1].start() if i + 1 < len(starts) else len(content)
-            window = content[section_start:boundary]
+            if f.readline() != "---\n":
+                return dict()
+            for line in f:
+                if line == "---\n":
+                    return yaml.load("".join(lines), Loader=YamlLoader) or dict()
+                lines.append(line)
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Failed to load frontmatter from {file_path}: {e}")
+    return dict()
 
-            # Find the last </span> before the boundary, if any.
-            last_close = None
-            for close in CLOSE_RE.finditer(window):
-                last_close = close
-            if last_close is not None:
-                section_content = window[: last_close.start()]
-            else:
-                # No closing tag before next wrapper/EOF; take everything.
-                section_content = window
 
-            translations[checksum] = section_content.strip()
+TYPE_RE = re.compile(r'\bdata-turtletranslate-type="([^"]+)"', re.IGNORECASE)
+INDEX_RE = re.compile(r'\bdata-turtletranslate-index="(\d+)"', re.IGNORECASE)
 
-    except Exception as e:
-        logger.warning(f"Failed to load translations from {file_path}: {e}")
 
-    return translations
+def load_checksums_from_file(file_path: str) -> Dict[str, tuple[str, int]]:
+    """
+    Index the section wrappers of a translated file without extracting their content.
+    :param file_path: Path to the translated document.
+    :return: A dictionary of checksum -> (section type, section index). Empty if the file could not be read.
+    """
+    checksums: Dict[str, tuple[str, int]] = {}
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+    except OSError as e:
+        logger.warning(f"Failed to load checksums from {file_path}: {e}")
+        return checksums
+
+    for m in START_RE.finditer(content):
+        tag = m.group(0)
+        section_type, index = TYPE_RE.search(tag), INDEX_RE.search(tag)
+        checksums[m.group(1)] = (
+            section_type.group(1) if section_type else None,
+            int(index.group(1)) if index else None,
+        )
+    return checksums
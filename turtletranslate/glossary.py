@@ -0,0 +1,126 @@
+import csv
+import json
+from collections import deque
+
+from turtletranslate.logger import logger
+from turtletranslate.masking import MASKED_SPANS
+
+
+class _Automaton:
+    """Aho-Corasick automaton over lowercased patterns, matching in a single pass over the text."""
+
+    def __init__(self, patterns: list[str]):
+        self.goto = [dict()]  # State -> character -> next state
+        self.fail = [0]
+        self.output = [list()]  # State -> indexes of the patterns ending in it
+        for i, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append(list())
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append(i)
+
+        # Breadth first, so the failure link of a state is always computed before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(ch, 0)
+                self.output[child] += self.output[self.fail[child]]
+
+    def search(self, text: str):
+        """Yield (end index, pattern index) for every occurrence of every pattern in text."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for pattern in self.output[state]:
+                yield i, pattern
+
+
+class Glossary:
+    """
+    Terminology that must be translated consistently, i.e. {"pull request": "solicitud de extracción"}.
+
+    Terms are compiled once into an Aho-Corasick automaton, so finding the terms used in a section is linear in the
+    length of the section regardless of the size of the glossary. Only whole words are matched, ignoring case.
+    A term mapping to itself is kept as is in the translation (i.e. product names). Terms inside inline code, URLs,
+    HTML and math are ignored, since that text is never translated.
+    """
+
+    def __init__(self, terms: dict[str, str]):
+        self.terms = {source.strip(): target.strip() for source, target in terms.items() if source.strip()}
+        self._sources = list(self.terms)
+        self._source_matcher = _Automaton([source.lower() for source in self._sources])
+        self._targets = sorted(set(self.terms.values()))
+        self._target_matcher = _Automaton([target.lower() for target in self._targets])
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @staticmethod
+    def _translatable(text: str) -> str:
+        return MASKED_SPANS.sub(" ", text)
+
+    @staticmethod
+    def _find(matcher: _Automaton, patterns: list[str], text: str, overlapping: bool = True) -> set[str]:
+        lowered = text.lower()
+        spans = list()
+        for end, i in matcher.search(lowered):
+            start = end - len(patterns[i]) + 1
+            if (start == 0 or not lowered[start - 1].isalnum()) and (
+                end + 1 == len(lowered) or not lowered[end + 1].isalnum()
+            ):
+                spans.append((start, end, i))
+        if overlapping:
+            return {patterns[i] for _, _, i in spans}
+
+        # Leftmost longest, so "request" is not required on its own when it is part of "pull request"
+        found, covered = set(), -1
+        for start, end, i in sorted(spans, key=lambda span: (span[0], span[0] - span[1])):
+            if start > covered:
+                found.add(patterns[i])
+                covered = end
+        return found
+
+    def entries(self, text: str) -> dict[str, str]:
+        """The glossary entries whose source term appears in the text, in glossary order."""
+        found = self._find(self._source_matcher, self._sources, self._translatable(text), overlapping=False)
+        return {source: self.terms[source] for source in self._sources if source in found}
+
+    def check(self, original: str, translated: str) -> list[str]:
+        """Find required target terms missing from a translation, without asking an LLM."""
+        required = self.entries(original)
+        if not required:
+            return list()
+        present = self._find(self._target_matcher, self._targets, self._translatable(translated))
+        missing = [f'"{source}" -> "{target}"' for source, target in required.items() if target not in present]
+        if missing:
+            return [f"Glossary terms were not translated as required: {', '.join(missing)}"]
+        return list()
+
+    def format(self, text: str) -> str:
+        """The entries appearing in the text, formatted for a prompt (empty if there are none)."""
+        return "\n".join(f"- {source}: {target}" for source, target in self.entries(text).items())
+
+    @classmethod
+    def load(cls, path: str) -> "Glossary":
+        """Load a glossary from a JSON object ({"term": "translation"}), or a two column CSV/TSV file."""
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if str(path).endswith(".json"):
+                terms = json.load(f)
+            else:
+                delimiter = "\t" if str(path).endswith(".tsv") else ","
+                terms = {row[0]: row[1] for row in csv.reader(f, delimiter=delimiter) if len(row) >= 2}
+        glossary = cls(terms)
+        logger.info(f"Loaded {len(glossary)} glossary terms from {path}")
+        return glossary
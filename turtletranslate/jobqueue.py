@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from turtletranslate.exceptions import TurtleTranslateException
+from turtletranslate.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    language TEXT NOT NULL,
+    version TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    updated REAL,
+    UNIQUE (source, target)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, size);
+"""
+
+
+@dataclass
+class Job:
+    id: int
+    source: str
+    target: str
+    language: str
+    attempts: int
+
+
+class JobQueue:
+    """
+    Durable queue of (document, language) jobs in a SQLite database, shared by worker processes.
+
+    A worker claims a job with a lease, and extends it with heartbeats while it works. Jobs whose lease expired (i.e.
+    their worker crashed) are claimed again by the next worker, until they run out of attempts. The largest documents
+    are claimed first, so the longest jobs do not end up alone at the end of a run.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def add(
+        self,
+        source: str,
+        target: str,
+        language: str,
+        version: str = "",
+        size: int = 0,
+        max_attempts: int = 3,
+        force: bool = False,
+    ):
+        """
+        Queue a job. A job that already exists for the same version of the source keeps its state (so a restarted run
+        resumes), except failed jobs, which get a new set of attempts. A new version of the source is queued again, and
+        so is a done job whose target no longer exists, or every done job with force.
+        """
+        redo = force or not os.path.exists(target)
+        self._db.execute(
+            "INSERT INTO jobs (source, target, language, version, size, max_attempts, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (source, target) DO UPDATE SET "
+            "status = 'pending', attempts = 0, error = NULL, worker = NULL, lease_until = NULL, "
+            "language = excluded.language, version = excluded.version, size = excluded.size, "
+            "max_attempts = excluded.max_attempts, updated = excluded.updated "
+            "WHERE jobs.version != excluded.version OR jobs.status = 'failed' OR (? AND jobs.status = 'done')",
+            (str(source), str(target), language, version, size, max_attempts, time.time(), redo),
+        )
+
+    def claim(self, worker: str, lease: float) -> Job:
+        """Claim the largest pending (or abandoned) job for a worker, or return None if there is nothing to claim."""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # Abandoned jobs that used up their attempts are given up on
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Lease expired after the last attempt', updated = ? "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = self._db.execute(
+                "SELECT id, source, target, language, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY size DESC, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated = ? WHERE id = ?",
+                    (worker, now + lease, now, row[0]),
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, source, target, language, attempts = row
+        return Job(job_id, source, target, language, attempts + 1)
+
+    def heartbeat(self, job: Job, worker: str, lease: float) -> bool:
+        """Extend the lease of a job, returning False if the worker no longer holds it."""
+        cursor = self._db.execute(
+            "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + lease, time.time(), job.id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job: Job, worker: str):
+        self._db.execute(
+            "UPDATE jobs SET status = 'done', error = NULL, lease_until = NULL, updated = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job.id, worker),
+        )
+
+    def fail(self, job: Job, worker: str, error: str):
+        """Release a failed job to be retried, or mark it as failed if it used up its attempts."""
+        self._db.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+            "error = ?, lease_until = NULL, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, time.time(), job.id, worker),
+        )
+
+    def stats(self) -> dict[str, int]:
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def jobs(self, status: str) -> list[tuple[str, str, str, str]]:
+        """The (source, target, language, error) of every job with the given status."""
+        return self._db.execute(
+            "SELECT source, target, language, error FROM jobs WHERE status = ? ORDER BY id", (status,)
+        ).fetchall()
+
+
+def _heartbeat(path: str, job: Job, worker: str, lease: float, stop: threading.Event):
+    queue = JobQueue(path)  # SQLite connections can not be shared between threads
+    try:
+        while not stop.wait(lease / 3):
+            if not queue.heartbeat(job, worker, lease):
+                logger.warning(f"Worker {worker} lost the lease of {job.source} ({job.language})")
+                return
+    finally:
+        queue.close()
+
+
+def work(path: str, host: str, translator_options: dict, lease: float = 60.0, poll: float = 5.0):
+    """
+    Claim and translate jobs until the queue is drained. Runs in each worker process.
+    :param path: Path to the queue database.
+    :param host: Ollama server, every process creates its own client.
+    :param translator_options: Keyword arguments for TurtleTranslator (model, source_language, etc.), without client.
+    :param lease: Seconds a job is leased for, it is extended by a heartbeat every third of it.
+    :param poll: Seconds to wait before checking again for abandoned jobs while other workers are still running.
+    """
+    import ollama
+
+    from turtletranslate import TurtleTranslator
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    client = ollama.Client(host)
+    queue = JobQueue(path)
+    try:
+        while True:
+            job = queue.claim(worker, lease)
+            if job is None:
+                if queue.stats()["running"]:
+                    time.sleep(min(poll, lease))  # Jobs of a crashed worker are claimable once their lease expires
+                    continue
+                return
+
+            logger.info(f"[{worker}] Translating {job.source} -> {job.target} (attempt {job.attempts})")
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, args=(path, job, worker, lease, stop), daemon=True)
+            heartbeat.start()
+            try:
+                with open(job.source, "r", encoding="utf-8") as f:
+                    document = f.read()
+                options = {**translator_options, "client": client, "return_document": False}
+                turtle = TurtleTranslator(
+                    **options, document=document, target_language=job.language, target_filename=job.target
+                )
+                turtle.translate()
+                if not turtle.written:
+                    raise TurtleTranslateException(f"Could not write {job.target}")
+                queue.complete(job, worker)
+            except Exception as e:
+                logger.error(f"[{worker}] Failed to translate {job.source} ({job.language}): {e}")
+                queue.fail(job, worker, str(e))
+            finally:
+                stop.set()
+                heartbeat.join()
+    finally:
+        queue.close()
+
+
+def run_workers(path: str, host: str, translator_options: dict, processes: int = 2, lease: float = 60.0) -> dict:
+    """Start worker processes on a queue, wait until it is drained, and return the final queue stats."""
+    workers = [
+        multiprocessing.Process(target=work, args=(path, host, translator_options, lease), daemon=False)
+        for _ in range(max(1, processes))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            logger.error(f"Worker process {worker.pid} exited with code {worker.exitcode}")
+
+    queue = JobQueue(path)
+    try:
+        return queue.stats()
+    finally:
+        queue.close()
@@ -0,0 +1,82 @@
+import json
+import os
+
+from turtletranslate.logger import logger
+
+JOURNAL_SUFFIX = ".turtlejournal"
+
+
+def journal_path(target_filename: str) -> str:
+    """The journal lives next to the target file, i.e. docs/index_en.md -> docs/index_en.md.turtlejournal"""
+    return f"{target_filename}{JOURNAL_SUFFIX}"
+
+
+class SectionJournal:
+    """
+    Append-only journal of approved sections, so a crashed run can pick up where it left off.
+
+    Every approved section is written as a single JSON line (checksum, type, text). Lines are flushed and fsynced
+    in batches of `fsync_every` entries, and on close. A torn last line (i.e. from a crash mid-write) is ignored when
+    the journal is loaded.
+    """
+
+    def __init__(self, target_filename: str, fsync_every: int = 8):
+        self.path = journal_path(target_filename)
+        self.fsync_every = max(1, fsync_every)
+        self._file = None
+        self._pending = 0
+
+    def load(self) -> dict[str, str]:
+        """Load the journaled sections as a dictionary of checksum -> translated text."""
+        sections = dict()
+        if not os.path.exists(self.path):
+            return sections
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        sections[entry["checksum"]] = entry["text"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        logger.warning(f"Skipping malformed journal entry in {self.path}")
+        except OSError as e:
+            logger.warning(f"Failed to load journal {self.path}: {e}")
+        if sections:
+            logger.info(f"Recovered {len(sections)} journaled sections from {self.path}")
+        return sections
+
+    def append(self, checksum: str, section_type: str, text: str):
+        """Append an approved section to the journal, fsyncing once every `fsync_every` entries."""
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        entry = {"checksum": checksum, "type": section_type, "text": text}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush and fsync any pending entries to disk."""
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        """Sync and close the journal, keeping it on disk for the next run."""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def discard(self):
+        """Close and delete the journal, i.e. after the translated document has been written successfully."""
+        self.close()
+        try:
+            os.remove(self.path)
+            logger.debug(f"Removed journal {self.path}")
+        except FileNotFoundError:
+            pass
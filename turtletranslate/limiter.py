@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from turtletranslate.logger import logger
+
+
+# Evaluating a prompt token costs roughly a tenth of generating one, used when the server does not report durations
+PROMPT_TOKEN_WEIGHT = 0.1
+
+
+class _Slot:
+    """Handed out by AdaptiveLimiter.request, update it with the response of the request."""
+
+    def __init__(self):
+        self.tokens = 0  # Generated tokens
+        self.prompt_tokens = 0
+        self.compute = 0.0  # Seconds Ollama spent loading the model, evaluating the prompt and generating
+
+    def update(self, response):
+        self.tokens = getattr(response, "eval_count", None) or 0
+        self.prompt_tokens = getattr(response, "prompt_eval_count", None) or 0
+        durations = ("load_duration", "prompt_eval_duration", "eval_duration")
+        self.compute = sum(getattr(response, key, None) or 0 for key in durations) / 1e9
+
+
+class AdaptiveLimiter:
+    """
+    Limit the number of requests in flight to Ollama, adjusting the limit to the latency it observes (AIMD).
+
+    The latency of every request is normalized by the time Ollama reports it spent computing the response, so a short
+    critic verdict and a long translation are comparable, and what is left is the time spent waiting in its queue.
+    Without reported durations, the latency is normalized by the (weighted) prompt and generated tokens instead. It is
+    compared to the lowest normalized latency seen so far (the baseline, which slowly drifts up so it can follow a
+    model change). While the latency stays within `tolerance` times the baseline and the limit is reached, the limit
+    grows by about one request per round of requests (additive increase). Once requests start to wait in Ollama's own
+    queue their latency jumps, and the limit is cut by `backoff` (multiplicative decrease), at most once per round so a
+    single burst is not punished several times.
+    Failed requests (i.e. timeouts) are treated as congestion.
+
+    One limiter is meant to be shared by every translator (and thread) using the same Ollama server. It blocks threads
+    while they wait, so it is only used by the synchronous API, the async API is bounded by its asyncio.Semaphore.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        tolerance: float = 1.5,
+        backoff: float = 0.7,
+        drift: float = 0.001,
+        window: float = 30.0,
+    ):
+        """
+        :param initial: Number of requests allowed in flight at first.
+        :param min_limit: The limit never goes below this.
+        :param max_limit: The limit never goes above this.
+        :param tolerance: Normalized latency relative to the baseline that is considered congestion.
+        :param backoff: Factor the limit is multiplied with on congestion.
+        :param drift: Relative amount the baseline drifts up with every request.
+        :param window: Seconds of completed requests the throughput is measured over.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.drift = drift
+        self.window = window
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._baseline = None  # Lowest normalized latency, drifting up slowly
+        self._last_decrease = 0.0
+        self._completed = deque()  # (finish time, tokens) of requests within the window
+        self._changed = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def throughput(self) -> dict:
+        """Requests and generated tokens per second over the last window."""
+        with self._changed:
+            self._trim(time.monotonic())
+            requests = len(self._completed)
+            tokens = sum(tokens for _, tokens in self._completed)
+            span = min(self.window, time.monotonic() - self._completed[0][0]) if self._completed else 0.0
+        span = max(span, 1e-9)
+        return {"requests_per_second": requests / span if requests else 0.0, "tokens_per_second": tokens / span}
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "baseline": self._baseline, **self.throughput()}
+
+    def _trim(self, now: float):
+        while self._completed and now - self._completed[0][0] > self.window:
+            self._completed.popleft()
+
+    def acquire(self) -> float:
+        """Wait for a free slot, returning the time the request started."""
+        with self._changed:
+            while self._in_flight >= self.limit:
+                self._changed.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(
+        self, started: float, tokens: int = 0, failed: bool = False, prompt_tokens: int = 0, compute: float = 0.0
+    ):
+        """
+        Free a slot, and adjust the limit to the latency of the request.
+        :param started: The time the request started, as returned by acquire.
+        :param tokens: Number of generated tokens.
+        :param failed: Whether the request failed, which counts as congestion.
+        :param prompt_tokens: Number of evaluated prompt tokens.
+        :param compute: Seconds the server reported computing the response, 0 if unknown.
+        """
+        now = time.monotonic()
+        with self._changed:
+            self._in_flight -= 1
+            if compute > 0:
+                latency = (now - started) / compute
+            else:
+                latency = (now - started) / max(1.0, tokens + prompt_tokens * PROMPT_TOKEN_WEIGHT)
+            if not failed:
+                self._completed.append((now, tokens))
+                self._trim(now)
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    self._baseline *= 1 + self.drift
+
+            if failed or latency > self.tolerance * self._baseline:
+                # Only the first congested request of a round decreases the limit
+                if started >= self._last_decrease:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._last_decrease = now
+                    logger.debug(f"Congestion, decreasing the concurrency limit to {self.limit}")
+            elif self._in_flight + 1 >= int(self._limit):
+                # Only grow while the limit is what holds requests back, so idle capacity does not pile up
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._changed.notify_all()
+
+    @contextmanager
+    def request(self):
+        """Hold a slot for the duration of a request: `with limiter.request() as slot: ...; slot.update(response)`"""
+        slot = _Slot()
+        started = self.acquire()
+        try:
+            yield slot
+        except BaseException:
+            self.release(started, slot.tokens, failed=True)
+            raise
+        self.release(started, slot.tokens, prompt_tokens=slot.prompt_tokens, compute=slot.compute)
@@ -0,0 +1,66 @@
+import re
+from collections import Counter
+
+# Spans the model should not see (or touch): they are swapped for placeholders before prompting, and restored after
+MASKED_SPANS = re.compile(
+    "|".join(
+        [
+            r"\$\$.+?\$\$",  # Display math
+            r"(?<![\\$\w])\$(?=\S)[^$\n]+?(?<=\S)\$(?!\d)",  # Inline math, but not amounts like "$5 and $10"
+            r"(?<!`)`[^`\n]+`(?!`)",  # Inline code
+            r"<!--.*?-->",  # HTML comments
+            r"</?[A-Za-z][\w-]*(?:\s[^<>]*)?/?>",  # HTML tags (the text between them is still translated)
+            r"(?<=\]\()[^)\s]+(?:\s+\"[^\"]*\")?(?=\))",  # Link and image targets (the anchor and alt texts are not)
+            r"(?<=\]: )\S+",  # Reference link definitions, i.e. "[1]: https://..."
+            r"\b(?:https?|ftp)://[^\s)\]>\"'`]+",  # Bare URLs
+        ]
+    ),
+    re.DOTALL,
+)
+PLACEHOLDER = "⟦{}⟧"
+PLACEHOLDER_RE = re.compile(r"⟦\s*(\d+)\s*⟧")
+
+
+class Masker:
+    """
+    Swap URLs, inline code, HTML, link targets and math in prompt values for compact placeholders (i.e. "⟦1⟧"), and
+    restore them in the response. The same span always gets the same placeholder, so several values masked by one
+    Masker (a section and its previous translation) share their placeholders.
+    """
+
+    def __init__(self):
+        self.spans = list()
+        self._placeholders = dict()  # Span -> placeholder
+        self.expected = Counter()  # Placeholder -> number of times it appears in the masked section
+
+    def _placeholder(self, span: str) -> str:
+        if span not in self._placeholders:
+            self.spans.append(span)
+            self._placeholders[span] = PLACEHOLDER.format(len(self.spans))
+        return self._placeholders[span]
+
+    def mask(self, text: str, expect: bool = False) -> str:
+        """Mask a value. With expect, its placeholders are the ones the response has to contain exactly once each."""
+        masked = MASKED_SPANS.sub(lambda m: self._placeholder(m.group(0)), text)
+        if expect:
+            self.expected.update(PLACEHOLDER_RE.findall(masked))
+        return masked
+
+    def unmask(self, text: str) -> tuple[str, list[str]]:
+        """Restore the placeholders in a response, returning it and the problems found (lost or added placeholders)."""
+        found = Counter(PLACEHOLDER_RE.findall(text))
+        problems = list()
+        missing = sorted((self.expected - found).keys(), key=int)
+        if missing:
+            problems.append(f"Protected spans were removed: {', '.join(self.spans[int(i) - 1] for i in missing)}")
+        duplicated = sorted((found - self.expected).keys(), key=int)
+        if duplicated:
+            problems.append(
+                f"Placeholders were duplicated or made up: {', '.join(PLACEHOLDER.format(i) for i in duplicated)}"
+            )
+
+        def restore(match: re.Match) -> str:
+            i = int(match.group(1))
+            return self.spans[i - 1] if 0 < i <= len(self.spans) else match.group(0)
+
+        return PLACEHOLDER_RE.sub(restore, text), problems
@@ -7,8 +7,16 @@ from turtletranslate.models.summary import (
     SUMMARIZER_CRITIC_PROMPT,
     SUMMARIZER_WORKER_SYSTEM,
     SUMMARIZER_WORKER_PROMPT,
+    SUMMARIZER_CHUNK_PROMPT,
+    SUMMARIZER_REDUCE_PROMPT,
+    SUMMARY_CONTEXT,
 )
 from turtletranslate.models.translation import (
+    SHARED_PREFIX_SYSTEM,
+    GLOSSARY_CONTEXT,
+    MASK_CONTEXT,
+    PREVALIDATION_NOTES,
+    TABLE_CRITIQUE,
     TRANSLATION_CRITIC_BLOCKQUOTE_SYSTEM,
     TRANSLATION_CRITIC_BLOCKQUOTE_PROMPT,
     TRANSLATION_CRITIC_ARTICLE_SYSTEM,
@@ -25,8 +33,24 @@ from turtletranslate.models.translation import (
     TRANSLATION_WORKER_CODEFENCE_PROMPT,
     TRANSLATION_WORKER_WILDCARD_SYSTEM,
     TRANSLATION_WORKER_WILDCARD_PROMPT,
+    TRANSLATION_WORKER_TABLE_SYSTEM,
+    TRANSLATION_WORKER_TABLE_PROMPT,
+    TRANSLATION_CRITIC_TABLE_SYSTEM,
+    TRANSLATION_CRITIC_TABLE_PROMPT,
+    TRANSLATION_REVISE_ARTICLE_PROMPT,
+    TRANSLATION_REVISE_BLOCKQUOTE_PROMPT,
+    TRANSLATION_REVISE_CODEFENCE_PROMPT,
+    TRANSLATION_REVISE_WILDCARD_PROMPT,
+    TRANSLATION_UPDATE_SYSTEM,
+    TRANSLATION_UPDATE_PROMPT,
     PREPEND_TRANSLATION_WORKER_SYSTEM,
     PREPEND_TRANSLATION_WORKER_PROMPT,
     PREPEND_TRANSLATION_CRITIC_SYSTEM,
     PREPEND_TRANSLATION_CRITIC_PROMPT,
 )
+from turtletranslate.models.verdict import (
+    VERDICT_PROMPT,
+    VERDICT_REASON_PROMPT,
+    VERDICT_SCHEMA,
+    VERDICT_REASON_SCHEMA,
+)
@@ -31,3 +31,27 @@ Generated Summary:
 --- SUMMARY END ---
 
 Does the summary accurately represent the critical content of the original document?"""
+
+
+# Map-reduce summaries, for documents that do not fit in a single prompt
+SUMMARIZER_CHUNK_PROMPT = """\
+Read the part of a markdown document below and summarize its main points in a few sentences. Your summary will be combined with the summaries of the other parts of the document, and used as context to assist translators.
+
+Respond using only the summary text, without any additional information.
+
+Here is the part of the document you need to summarize:
+{document}"""
+
+SUMMARIZER_REDUCE_PROMPT = """\
+Below are summaries of consecutive parts of a markdown document. Combine them into one clear, concise and informative summary of the whole document, focusing on the main topics and critical details. Your summary will be used as context to assist translators.
+
+Respond using only the summary text, without any additional information.
+
+Here are the summaries of each part of the document:
+{document}"""
+
+# Appended to the system of translation workers when a summary is available
+SUMMARY_CONTEXT = """
+
+For context, here is a summary of the whole document. Only use it to understand the section, never translate it or include it in your response:
+{summary}"""
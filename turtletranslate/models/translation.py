@@ -1,3 +1,24 @@
+# Shared system for every request of a run in prefix cache mode, so the server can reuse its prompt cache across
+# requests. Type specific instructions are moved to the start of the prompt, followed by the section last.
+SHARED_PREFIX_SYSTEM = """\
+You are an expert markdown translator and translation reviewer, working on a document written in {source_language} that is being translated to {target_language}, one small section at a time. Follow the instructions of each request exactly, and only respond with what is asked for."""
+
+# Appended to the translator and critic systems, with the glossary entries that appear in the section
+GLOSSARY_CONTEXT = """
+
+The following terms must be translated exactly as given in this glossary (term: required translation):
+{glossary}"""
+
+# Appended to critic prompts with the findings of the deterministic checks that are left to the critic to judge
+PREVALIDATION_NOTES = """
+
+Note from the automated checks: {notes} This is not necessarily a mistake (commands, names and proper nouns are kept as they are), judge it by the criteria above."""
+
+# Appended to the translator systems when spans of the section were swapped for placeholders
+MASK_CONTEXT = """
+
+The section contains placeholders like ⟦1⟧, standing for links, code, HTML and math that must not be translated. Keep every placeholder exactly as it is, exactly once, where it belongs in the translated sentence."""
+
 # Blockquote-specific system and prompt
 TRANSLATION_WORKER_BLOCKQUOTE_SYSTEM = """\
 You are an expert markdown translator specialized in translating blockquotes and callouts from {source_language} to {target_language}. Translate only the textual content, strictly preserving markdown formatting, syntax, special structures like '> [!note]', and the exact type of callouts (e.g., 'note', 'warning', 'tip')."""
@@ -100,6 +121,47 @@ Original vs Translated:
 ==TRANSLATED_VERSION==
 {translated_section}"""
 
+# Table-specific system and prompt, the worker only gets the unique cells that need translation
+TRANSLATION_WORKER_TABLE_SYSTEM = """\
+You are an expert translator specialized in the cells of markdown tables, translating them from {source_language} to {target_language}. You are given the cells of a table as a JSON object, and translate its **values** while leaving the **keys** unchanged."""
+
+TRANSLATION_WORKER_TABLE_PROMPT = """\
+Translate the table cells from {source_language} to {target_language}. Respond with a JSON object with exactly the same keys, and the translated cells as values.
+
+1. Translate each cell accurately and concisely, as a cell of a table with the other cells as context.
+2. Preserve inline markdown in the cells exactly (bold, italics, links, `inline code`).
+3. Keep numerical data, units, names and identifiers unchanged.
+4. Do not add line breaks, pipes (|), or any additional content.
+
+**Table:**
+{section}
+
+**Cells:**
+{cells}"""
+
+TRANSLATION_CRITIC_TABLE_SYSTEM = """\
+You are an expert markdown translation reviewer for tables. Verify the cells of a table are accurately translated from {source_language} to {target_language}, consistently across the table."""
+
+TRANSLATION_CRITIC_TABLE_PROMPT = """\
+Review the markdown table translation. Respond "YES" if criteria are met, or "NO - Explanation:" otherwise.
+
+Criteria:
+1. Semantically accurate and consistent translation of the cells.
+2. Natural, concise phrasing in {target_language}.
+3. No alterations to numerical data, names, inline code or links.
+4. Cells that are names, brands or terms used as they are in {target_language} are correctly left unchanged.
+
+Original vs Translated:
+{section}
+==TRANSLATED_VERSION==
+{translated_section}"""
+
+# Appended to the table worker prompt when a table is translated again after a rejection
+TABLE_CRITIQUE = """
+
+A previous translation of these cells was rejected by the reviewer: {critique}
+Fix the problems pointed out, and keep the cells that are names or terms unchanged."""
+
 # Wildcard-specific system and prompt
 TRANSLATION_WORKER_WILDCARD_SYSTEM = """\
 You are an expert markdown translator tasked with translating miscellaneous markdown content from {source_language} to {target_language}. Translate textual content accurately and naturally, while strictly preserving original markdown formatting and syntax."""
@@ -128,6 +190,26 @@ Original vs Translated:
 {translated_section}"""
 
 
+# Update an existing translation after a small edit to the source
+TRANSLATION_UPDATE_SYSTEM = """\
+You are an expert markdown translator maintaining existing translations from {source_language} to {target_language}. The source text has been slightly edited since it was translated, and you update the existing translation to match the edit, changing as little as possible."""
+
+TRANSLATION_UPDATE_PROMPT = """\
+The previous version of the {source_language} markdown section was translated to {target_language} as shown below. Update the translation so it matches the new version of the section, following these rules:
+
+1. Only change the parts of the translation affected by the edit, keep everything else exactly as it is.
+2. Preserve markdown syntax, links, numbers, spacing and line breaks exactly as in the new version.
+3. Do not add or remove any content, and keep your opinion out of the translation.
+
+Previous version:
+{previous_section}
+==PREVIOUS_TRANSLATION==
+{previous_translation}
+
+Only respond with the updated translation of the new version:
+{section}"""
+
+
 PREPEND_TRANSLATION_WORKER_SYSTEM = """\
 Translate the markdown document from {source_language} to {target_language}. Ensure accurate and natural translations, preserving markdown formatting, syntax, and structure."""
 
@@ -163,3 +245,83 @@ Original vs Translated:
 {section}
 ==TRANSLATED_VERSION==
 {translated_section}"""
+
+
+# Revise a rejected translation with the critique it was given, instead of translating the section again from scratch
+TRANSLATION_REVISE_ARTICLE_PROMPT = """\
+Your translation of the markdown article section from {source_language} to {target_language} was rejected by the reviewer. Revise it following these rules:
+
+1. Fix every problem pointed out in the critique.
+2. Keep the parts of the translation that were not criticized as they are.
+3. Preserve headings (e.g., #, ##, ###), bold (**), italics (*), lists, tables, and all other markdown structures exactly.
+4. Keep numerical data, dates, measurements, units and markdown links unchanged.
+5. Do not add or remove any content, and keep your opinion out of the translation.
+
+Critique:
+{critique}
+
+Original section:
+{section}
+
+Rejected translation:
+{translated_section}
+
+Only respond with the revised markdown text."""
+
+TRANSLATION_REVISE_BLOCKQUOTE_PROMPT = """\
+Your translation of the blockquote markdown content from {source_language} to {target_language} was rejected by the reviewer. Revise it following these rules:
+
+1. Fix every problem pointed out in the critique.
+2. Keep the parts of the translation that were not criticized as they are.
+3. Preserve markdown syntax exactly (blockquote formatting '> ', callouts '> [!note]', etc.), and leave callout markers (> [!...]) untranslated.
+4. Retain emojis, symbols, spaces, line breaks, and indentation precisely.
+5. Do not add or remove any content, and keep your opinion out of the translation.
+
+Critique:
+{critique}
+
+Original blockquote:
+{section}
+
+Rejected translation:
+{translated_section}
+
+Only respond with the revised blockquote text."""
+
+TRANSLATION_REVISE_CODEFENCE_PROMPT = """\
+Your translation of the comments in a markdown code block from {source_language} to {target_language} was rejected by the reviewer. Revise it following these rules:
+
+1. Fix every problem pointed out in the critique.
+2. Keep the parts of the translation that were not criticized as they are.
+3. Only translate comments, and never modify executable code or programming syntax.
+4. Keep all spacing, indentation, special symbols, and formatting unchanged.
+
+Critique:
+{critique}
+
+Original code block:
+{section}
+
+Rejected translation:
+{translated_section}
+
+Only respond with the revised code block."""
+
+TRANSLATION_REVISE_WILDCARD_PROMPT = """\
+Your translation of the markdown content from {source_language} to {target_language} was rejected by the reviewer. Revise it following these rules:
+
+1. Fix every problem pointed out in the critique.
+2. Keep the parts of the translation that were not criticized as they are.
+3. Ensure semantic accuracy and exact markdown preservation.
+4. Do not add or remove any content, and keep your opinion out of the translation.
+
+Critique:
+{critique}
+
+Original content:
+{section}
+
+Rejected translation:
+{translated_section}
+
+Only respond with the revised markdown text."""
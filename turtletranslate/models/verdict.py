@@ -0,0 +1,21 @@
+# Appended to critic prompts when structured verdicts are enabled, constrained by VERDICT_SCHEMA
+VERDICT_PROMPT = """
+
+Ignore the answer format above. Answer only with a JSON object: {"approved": true} if all criteria are met, otherwise {"approved": false}."""
+
+# Only requested after a rejection, constrained by VERDICT_REASON_SCHEMA
+VERDICT_REASON_PROMPT = """
+
+The translation does not meet the criteria. Ignore the answer format above, and answer only with a JSON object: {"reason": "<one short sentence explaining what must be fixed>"}."""
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {"approved": {"type": "boolean"}},
+    "required": ["approved"],
+}
+
+VERDICT_REASON_SCHEMA = {
+    "type": "object",
+    "properties": {"reason": {"type": "string"}},
+    "required": ["reason"],
+}
@@ -0,0 +1,124 @@
+import re
+import unicodedata
+
+from turtletranslate.tokens import NO_TRANSLATE_TOKEN, TABLE_TOKEN
+
+# Sections with at most this many words are considered low risk, and can be approved without a critic
+LOW_RISK_MAX_WORDS = 8
+# Allowed length ratio of the translation compared to the original (only checked for sections of MIN_RATIO_LENGTH+)
+LENGTH_RATIO_BOUNDS = (0.33, 3.0)
+MIN_RATIO_LENGTH = 40
+
+URL_RE = re.compile(r"\b(?:https?|ftp)://[^\s)\]>\"'`]+|\]\(([^)\s]+)")
+INLINE_CODE_RE = re.compile(r"(?<!`)`([^`\n]+)`(?!`)")
+CALLOUT_RE = re.compile(r"\[!([A-Za-z]+)\]")
+HEADING_RE = re.compile(r"^(#{1,6})\s", re.MULTILINE)
+BLOCKQUOTE_RE = re.compile(r"^[^\S\r\n]*>", re.MULTILINE)
+
+# Expected script of the letters in a translation, by target language (languages not listed are not checked)
+LATIN_LANGUAGES = (
+    "english spanish french german italian portuguese dutch norwegian swedish danish finnish polish czech slovak "
+    "hungarian romanian turkish vietnamese indonesian icelandic estonian latvian lithuanian croatian slovenian"
+).split()
+SCRIPTS = {
+    **{language: "LATIN" for language in LATIN_LANGUAGES},
+    **{language: "CYRILLIC" for language in ("russian", "ukrainian", "bulgarian", "serbian", "belarusian")},
+    **{language: "CJK" for language in ("chinese", "japanese")},
+    "greek": "GREEK",
+    "korean": "HANGUL",
+    "arabic": "ARABIC",
+    "persian": "ARABIC",
+    "hebrew": "HEBREW",
+    "hindi": "DEVANAGARI",
+    "thai": "THAI",
+}
+# Scripts that count towards another, i.e. Japanese kana counts as CJK
+SCRIPT_ALIASES = {"HIRAGANA": "CJK", "KATAKANA": "CJK"}
+
+
+def _urls(text: str) -> set[str]:
+    return {m.group(1) or m.group(0) for m in URL_RE.finditer(text)}
+
+
+def _letter_scripts(text: str) -> dict[str, int]:
+    """Count letters per script, i.e. {"LATIN": 120, "CJK": 3}."""
+    text = INLINE_CODE_RE.sub("", URL_RE.sub("", text))
+    counts = dict()
+    for ch in text:
+        if not ch.isalpha():
+            continue
+        script = unicodedata.name(ch, "UNKNOWN").split(" ")[0]
+        script = SCRIPT_ALIASES.get(script, script)
+        counts[script] = counts.get(script, 0) + 1
+    return counts
+
+
+def prevalidate(original: str, translated: str, section_type: str, target_language: str = None) -> list[str]:
+    """
+    Run cheap, deterministic checks on a translation before it reaches any critic.
+    :param original: The original section.
+    :param translated: The translated section.
+    :param section_type: The section type (token), i.e. "article" or "codefence".
+    :param target_language: The target language, used for a simple script check if the language is known.
+    :return: A list of problems found, empty if the translation passed every check.
+    """
+    problems = list()
+    if section_type == NO_TRANSLATE_TOKEN:
+        return problems
+    if not translated.strip():
+        return ["The translation is empty."]
+
+    if original.count("```") != translated.count("```"):
+        problems.append("Code fences (```) were added or removed.")
+    if [m.lower() for m in CALLOUT_RE.findall(original)] != [m.lower() for m in CALLOUT_RE.findall(translated)]:
+        problems.append("Callout markers (> [!...]) were changed, translated or removed.")
+    if HEADING_RE.findall(original) != HEADING_RE.findall(translated):
+        problems.append("The heading structure (#, ##, ...) was changed.")
+    if bool(BLOCKQUOTE_RE.search(original)) != bool(BLOCKQUOTE_RE.search(translated)):
+        problems.append("Blockquote markers (>) were added or removed.")
+
+    missing_urls = _urls(original) - _urls(translated)
+    if missing_urls:
+        problems.append(f"URLs were changed or removed: {', '.join(sorted(missing_urls))}")
+
+    if section_type != "codefence":
+        missing_code = set(INLINE_CODE_RE.findall(original)) - set(INLINE_CODE_RE.findall(translated))
+        if missing_code:
+            problems.append(f"Inline code was changed or removed: {', '.join(sorted(missing_code))}")
+
+    if len(original) >= MIN_RATIO_LENGTH:
+        ratio = len(translated) / len(original)
+        low, high = LENGTH_RATIO_BOUNDS
+        if not low <= ratio <= high:
+            problems.append(f"The translation is {ratio:.1f}x the length of the original.")
+
+    if section_type != "codefence" and target_language:
+        expected = SCRIPTS.get(target_language.strip().lower())
+        counts = _letter_scripts(translated)
+        total = sum(counts.values())
+        if expected and total >= 20 and counts.get(expected, 0) / total < 0.5:
+            problems.append(f"The translation is not written in the {expected.lower()} script of {target_language}.")
+
+    return problems
+
+
+def advise(original: str, translated: str, section_type: str) -> list[str]:
+    """
+    Findings that are not necessarily wrong, so they are given to the critic to judge instead of rejecting the
+    translation, i.e. a section left as it is may be a command or a list of product names. Tables are not checked,
+    their cells are often names, and the cells that need no translation are never sent to the model.
+    """
+    notes = list()
+    if section_type in (NO_TRANSLATE_TOKEN, "codefence", TABLE_TOKEN):
+        return notes
+    words = re.findall(r"[^\W\d_]{3,}", original)
+    if len(words) > LOW_RISK_MAX_WORDS and original.strip() == translated.strip():
+        notes.append("The translation is identical to the original.")
+    return notes
+
+
+def is_low_risk(original: str, section_type: str) -> bool:
+    """Whether a section is simple enough to approve without a critic once it passes prevalidation."""
+    if section_type == "codefence":
+        return False
+    return len(re.findall(r"\w+", original)) <= LOW_RISK_MAX_WORDS
@@ -0,0 +1,141 @@
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Generator
+
+from turtletranslate.logger import logger
+from turtletranslate import tracing
+
+if TYPE_CHECKING:
+    import asyncio
+
+    import ollama
+
+# A pipeline step is a generator yielding requests (keyword arguments for client.generate, or a Gather of sub-steps),
+# receiving their responses, and returning its result. The same steps are driven by the synchronous client with run(),
+# and by ollama.AsyncClient with arun(), so both paths share every cache, reuse and stats behavior.
+Step = Generator
+
+
+class Gather:
+    """
+    Yielded by a step to run several sub-steps concurrently, receiving the list of their results in order. run() uses
+    up to `workers` threads (a single worker runs them one by one in the calling thread), arun() runs all of them at
+    once, bounded by its semaphore.
+    """
+
+    def __init__(self, steps: list[Step], workers: int = 4):
+        self.steps = steps
+        self.workers = workers
+
+
+@lru_cache
+def _download_model_if_not_exists(client: "ollama.Client", model: str):
+    """Issues a pull command to the Ollama API if the model does not exist."""
+    import ollama  # The client stack (ollama, httpx) is only imported once a model is actually queried
+
+    logger.info(f"Checking if model {model} is installed")
+    with tracing.span("model_check", model=model):
+        try:
+            client.show(model)
+            logger.info(f"{model} is installed! Proceeding")
+        except ollama.ResponseError:
+            logger.info(f"{model} was not installed. Downloading...")
+            with tracing.span("model_pull", model=model):
+                client.pull(model)
+            logger.info(f"Downloaded {model}")
+
+
+_installed_models = weakref.WeakKeyDictionary()  # AsyncClient -> models known to be installed
+
+
+async def _adownload_model_if_not_exists(client: "ollama.AsyncClient", model: str):
+    """Async version of _download_model_if_not_exists."""
+    import ollama
+
+    installed = _installed_models.setdefault(client, set())
+    if model in installed:
+        return
+    logger.info(f"Checking if model {model} is installed")
+    with tracing.span("model_check", model=model):
+        try:
+            await client.show(model)
+            logger.info(f"{model} is installed! Proceeding")
+        except ollama.ResponseError:
+            logger.info(f"{model} was not installed. Downloading...")
+            with tracing.span("model_pull", model=model):
+                await client.pull(model)
+            logger.info(f"Downloaded {model}")
+    installed.add(model)
+
+
+def run(data, step: Step):
+    """Drive a step with the synchronous client of data, returning the result of the step."""
+    response, error = None, None
+    while True:
+        try:
+            request = step.throw(error) if error else step.send(response)
+        except StopIteration as stop:
+            return stop.value
+        response, error = None, None
+        try:
+            if isinstance(request, Gather) and request.workers <= 1:
+                response = [run(data, sub_step) for sub_step in request.steps]
+            elif isinstance(request, Gather):
+                with ThreadPoolExecutor(max_workers=request.workers) as pool:
+                    response = list(pool.map(lambda sub_step: run(data, sub_step), request.steps))
+            else:
+                _download_model_if_not_exists(data.client, request["model"])
+                if data.limiter is None:
+                    response = data.client.generate(**request)
+                else:
+                    with data.limiter.request() as slot:
+                        response = data.client.generate(**request)
+                        slot.update(response)
+        except Exception as e:
+            error = e  # Raised inside the step, so it can handle it like a synchronous call
+
+
+async def arun(data, step: Step, limiter: "asyncio.Semaphore"):
+    """
+    Drive a step with the ollama.AsyncClient of data, returning the result of the step.
+
+    At most limiter's value of requests are in flight at once. Cancelling the task awaiting arun cancels the in-flight
+    request, and closes the step so its cleanup (i.e. closing the journal) runs.
+    """
+    import asyncio
+
+    response, error = None, None
+    try:
+        while True:
+            try:
+                request = step.throw(error) if error else step.send(response)
+            except StopIteration as stop:
+                return stop.value
+            response, error = None, None
+            try:
+                if isinstance(request, Gather):
+                    response = await gather(*(arun(data, sub_step, limiter) for sub_step in request.steps))
+                else:
+                    async with limiter:
+                        await _adownload_model_if_not_exists(data.client, request["model"])
+                        response = await data.client.generate(**request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+    finally:
+        step.close()
+
+
+async def gather(*coroutines) -> list:
+    """Like asyncio.gather, but cancels the remaining coroutines as soon as one of them fails or is cancelled."""
+    import asyncio
+
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
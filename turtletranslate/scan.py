@@ -0,0 +1,129 @@
+import json
+import os
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from turtletranslate import TRANSLATABLE_FRONTMATTER_KEYS
+from turtletranslate.file_handler import parse, load_checksums_from_file, load_frontmatter_from_file
+from turtletranslate.logger import logger
+from turtletranslate.tokens import NO_TRANSLATE_TOKEN
+from turtletranslate.translate import FRONTMATTER_CHECKSUM_KEY, frontmatter_checksum, generate_checksum
+
+PLAN_VERSION = 1
+
+
+def source_frontmatter_checksum(source: str) -> str:
+    """Checksum of the translatable frontmatter of a source document (see frontmatter_checksum), None if it has none."""
+    frontmatter = load_frontmatter_from_file(source)
+    frontmatter = {k: v for k, v in frontmatter.items() if k in TRANSLATABLE_FRONTMATTER_KEYS}
+    return frontmatter_checksum(frontmatter) if frontmatter else None
+
+
+def _scan_document(source: str, targets: list[tuple[str, str, str]], prepend_md: str = "") -> list[dict]:
+    """
+    Parse a source document once, and compare its sections against every target file.
+
+    A section is "reusable" if its checksum exists in the target (or it needs no translation), "changed" if the
+    target has a section of the same type at the same index with a different checksum, and "new" otherwise. The
+    frontmatter is stale if the checksum of the translatable keys differs from the one the target was written with,
+    read from the target's stats, or else the recorded checksum given with the target (None if it is unknown).
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        frontmatter, sections = parse(f.read(), prepend_md=prepend_md)
+    sections = [(i, *list(s.items())[0]) for i, s in enumerate(sections)]
+    frontmatter = {k: v for k, v in (frontmatter or dict()).items() if k in TRANSLATABLE_FRONTMATTER_KEYS}
+    checksum = frontmatter_checksum(frontmatter) if frontmatter else None
+
+    results = list()
+    for target, language, recorded in targets:
+        existing = load_checksums_from_file(target) if os.path.exists(target) else dict()
+        by_index = {index: section_type for section_type, index in existing.values()}
+        new = changed = reusable = 0
+        for i, token, content in sections:
+            if token == NO_TRANSLATE_TOKEN or generate_checksum(content) in existing:
+                reusable += 1
+            elif by_index.get(i) == token:
+                changed += 1
+            else:
+                new += 1
+        stale_frontmatter = False
+        if existing and checksum is not None:
+            recorded = load_frontmatter_from_file(target).get(FRONTMATTER_CHECKSUM_KEY, recorded)
+            stale_frontmatter = recorded is not None and recorded != checksum
+        results.append(
+            {
+                "source": source,
+                "target": target,
+                "language": language,
+                "exists": os.path.exists(target),
+                "sections": len(sections),
+                "new": new,
+                "changed": changed,
+                "reusable": reusable,
+                "stale_frontmatter": stale_frontmatter,
+                "needs_translation": bool(new or changed or stale_frontmatter) or not existing,
+            }
+        )
+    return results
+
+
+def scan(
+    pairs: list[tuple[str, str, str]], prepend_md: str = "", workers: int = None, frontmatter_checksums: dict = None
+) -> list[dict]:
+    """
+    Report how much LLM work each (source, target, language) pair needs, using a process pool.
+    :param pairs: A list of (source path, target path, target language) tuples.
+    :param prepend_md: The markdown that will be prepended to every translation.
+    :param workers: Number of worker processes (defaults to the number of CPUs).
+    :param frontmatter_checksums: Source frontmatter checksums recorded per target path (i.e. in the manifest), for
+        targets written without stats.
+    :return: A list of per pair results, in the same order as the given pairs.
+    """
+    frontmatter_checksums = frontmatter_checksums or dict()
+    by_source = dict()
+    for source, target, language in pairs:
+        recorded = frontmatter_checksums.get(Path(target).as_posix())
+        by_source.setdefault(str(source), list()).append((str(target), language, recorded))
+
+    time = timeit.default_timer()
+    results = list()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_scan_document, source, targets, prepend_md) for source, targets in by_source.items()]
+        for future in futures:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                logger.error(f"Failed to scan document: {e}")
+
+    order = {(str(source), str(target)): i for i, (source, target, _) in enumerate(pairs)}
+    results.sort(key=lambda r: order[(r["source"], r["target"])])
+    stale = sum(r["needs_translation"] for r in results)
+    logger.info(
+        f"Scanned {len(results)} pairs in {timeit.default_timer() - time:.2f}s, {stale} need translation "
+        f"({sum(r['new'] for r in results)} new, {sum(r['changed'] for r in results)} changed, "
+        f"{sum(r['reusable'] for r in results)} reusable sections)"
+    )
+    return results
+
+
+def write_plan(path: str, results: list[dict]):
+    """Write the scan results as a machine-readable work plan."""
+    plan = {
+        "version": PLAN_VERSION,
+        "pairs": results,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    logger.info(f"Work plan written to {path}")
+
+
+def load_plan(path: str) -> list[dict]:
+    """Load the pairs that need translation from a work plan written by write_plan."""
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported work plan version: {plan.get('version')}")
+    return [pair for pair in plan["pairs"] if pair["needs_translation"]]
@@ -0,0 +1,364 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from turtletranslate import TurtleTranslator
+from turtletranslate.file_handler import load_translations_from_file
+from turtletranslate.glossary import Glossary
+from turtletranslate.logger import logger
+from turtletranslate.validator import validate
+
+# TurtleTranslator options a job may set, on top of the options the service was started with
+JOB_OPTIONS = (
+    "source_language",
+    "target_language",
+    "target_filename",
+    "prepend_md",
+    "summarize",
+    "review",
+    "similarity_threshold",
+    "wrap_in_span",
+    "add_stats",
+)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a service whose queue is at its depth limit."""
+
+
+class Job:
+    """A queued translate or validate job, and the events (section results) it has produced so far."""
+
+    def __init__(self, kind: str, payload: dict, priority: int = 0):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.status = "queued"  # queued -> running -> done or failed
+        self.events = list()
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self._changed = threading.Condition()
+
+    def emit(self, event: dict):
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def finish(self, status: str, result=None, error: str = None):
+        with self._changed:
+            self.status, self.result, self.error = status, result, error
+            self.events.append({"event": status, "result": result, "error": error})
+            self._changed.notify_all()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def stream(self, timeout: float = 30.0):
+        """Yield every event of the job, waiting for new ones until the job is finished."""
+        i = 0
+        while True:
+            with self._changed:
+                if i >= len(self.events) and not self.finished:
+                    self._changed.wait(timeout)
+                events, finished = self.events[i:], self.finished
+            if not events and not finished:
+                yield {"event": "heartbeat"}  # Lets the client (and the server) notice dead connections
+            i += len(events)
+            yield from events
+            if finished:
+                return
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "sections": sum(event["event"] == "section" for event in self.events),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class TranslationService:
+    """
+    Run translate and validate jobs from several callers on one shared client, in priority order.
+
+    Jobs wait in a priority queue with a depth limit, so callers are rejected (backpressure) instead of piling work on
+    Ollama. Every job shares the service's client, so models are only checked once, and the process wide parse,
+    summary and prepend caches. Translations are kept in memory per target file, like in watch mode, so resubmitted
+    documents only send their changed sections to the model.
+    """
+
+    def __init__(
+        self,
+        translator_options: dict,
+        workers: int = 1,
+        max_queue: int = 64,
+        keep_jobs: int = 1024,
+        output_root: str = ".",
+    ):
+        """
+        :param translator_options: Keyword arguments for TurtleTranslator (client, model, etc.) shared by every job.
+        :param workers: Number of jobs to run concurrently.
+        :param max_queue: Maximum number of queued jobs, before new jobs are rejected.
+        :param keep_jobs: Number of jobs to remember, the oldest finished jobs are forgotten first.
+        :param output_root: Directory the target files of jobs are confined to, relative targets are resolved in it.
+        """
+        self.translator_options = translator_options
+        self.output_root = os.path.realpath(output_root)
+        self.workers = workers
+        self.keep_jobs = keep_jobs
+        self.jobs = OrderedDict()  # Job id -> Job
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._order = itertools.count()  # FIFO among jobs of the same priority
+        self._lock = threading.Lock()
+        self._reuse = dict()  # Target filename -> checksum -> translation
+        self._threads = list()
+
+    def resolve_target(self, target: str) -> str:
+        """Resolve a target filename in the output root, raising ValueError if it (or a symlink in it) leads outside."""
+        path = os.path.realpath(os.path.join(self.output_root, target))
+        if os.path.commonpath([self.output_root, path]) != self.output_root:
+            raise ValueError(f"The target filename {target} is outside of the output directory")
+        return path
+
+    def submit(self, kind: str, payload: dict, priority: int = 0) -> Job:
+        """
+        Queue a job, higher priorities first. Raises QueueFull if the queue is at its depth limit, and ValueError if
+        its target filename is outside of the output root.
+        """
+        if payload.get("target_filename"):
+            payload = {**payload, "target_filename": self.resolve_target(payload["target_filename"])}
+        job = Job(kind, payload, priority)
+        try:
+            self._queue.put_nowait((-priority, next(self._order), job))
+        except queue.Full:
+            raise QueueFull(f"The queue is full ({self._queue.maxsize} jobs)")
+        with self._lock:
+            self.jobs[job.id] = job
+            finished = [key for key, old in self.jobs.items() if old.finished]
+            for key in finished[: max(0, len(self.jobs) - self.keep_jobs)]:
+                del self.jobs[key]
+        logger.info(f"Queued {kind} job {job.id} (priority {priority}, {self._queue.qsize()} queued)")
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(job.status == "running" for job in self.jobs.values())
+        return {"queued": self._queue.qsize(), "running": running, "workers": self.workers}
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            job.status = "running"
+            try:
+                result = self._translate(job) if job.kind == "translate" else self._validate(job)
+                job.finish("done", result=result)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                job.finish("failed", error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _translator(self, job: Job, **kwargs) -> TurtleTranslator:
+        options = {key: job.payload[key] for key in JOB_OPTIONS if key in job.payload}
+        return TurtleTranslator(**{**self.translator_options, **options, **kwargs}, document=job.payload["document"])
+
+    def _translate(self, job: Job) -> dict:
+        target = job.payload.get("target_filename")
+        with self._lock:
+            if target and target not in self._reuse:
+                self._reuse[target] = load_translations_from_file(target) if os.path.exists(target) else dict()
+            reuse = self._reuse.get(target)
+
+        def on_section(index: int, section: dict):
+            token, text = [(k, v) for k, v in section.items() if k != "checksum"][0]
+            job.emit({"event": "section", "index": index, "type": token, "checksum": section["checksum"], "text": text})
+
+        turtle = self._translator(job, reuse_index=reuse, on_section=on_section)
+        document = turtle.translate()
+        if target:
+            with self._lock:
+                self._reuse[target] = {
+                    s["checksum"]: text for s in turtle._translated_sections for k, text in s.items() if k != "checksum"
+                }
+        return {"document": document, "reuse_stats": turtle.reuse_stats, "prompt_stats": turtle.prompt_stats}
+
+    def _validate(self, job: Job) -> dict:
+        turtle = self._translator(job)
+        results = {"passed": [], "failed": []}
+        for checksum, (original, translated, section_type) in turtle.get_translation_tuples().items():
+            passed = validate(turtle, original, translated, section_type)
+            results["passed" if passed else "failed"].append(checksum)
+            job.emit({"event": "validated", "checksum": checksum, "passed": passed})
+        if job.payload.get("invalidate_checksums", True) and results["failed"]:
+            turtle.remove_failed_translation_checksums(results["failed"])
+        return results
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    POST /translate and POST /validate queue a job (202, or 503 when the queue is full), GET /jobs/<id> returns its
+    status, GET /jobs/<id>/events streams its section results as JSON lines, and GET /health returns the queue stats.
+    """
+
+    server: "TranslationServer"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        kind = self.path.strip("/")
+        if kind not in ("translate", "validate"):
+            return self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+        # Browsers can not send a cross-site JSON request without a preflight, unlike a text/plain form post
+        if self.headers.get_content_type() != "application/json":
+            return self._send_json(415, {"error": "The request body must be JSON (Content-Type: application/json)"})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._send_json(400, {"error": f"Invalid JSON: {e}"})
+        if not isinstance(payload, dict) or not isinstance(payload.get("document"), str):
+            return self._send_json(400, {"error": "A document (string) is required"})
+        if kind == "validate" and not payload.get("target_filename"):
+            return self._send_json(400, {"error": "A target_filename is required to validate translations"})
+        unknown = set(payload) - {"document", "priority", "invalidate_checksums", *JOB_OPTIONS}
+        if unknown:
+            return self._send_json(400, {"error": f"Unknown options: {', '.join(sorted(unknown))}"})
+
+        try:
+            priority = int(payload.get("priority", 0))
+        except (TypeError, ValueError):
+            return self._send_json(400, {"error": f"The priority must be an integer, not {payload['priority']!r}"})
+        if payload.get("target_filename") is not None and not isinstance(payload["target_filename"], str):
+            return self._send_json(400, {"error": "The target_filename must be a string"})
+
+        try:
+            job = self.server.service.submit(kind, payload, priority=priority)
+        except QueueFull as e:
+            return self._send_json(503, {"error": str(e)}, headers={"Retry-After": "5"})
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(202, job.to_dict(), headers={"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["health"]:
+            return self._send_json(200, self.server.service.stats())
+        if len(parts) not in (2, 3) or parts[0] != "jobs" or (len(parts) == 3 and parts[2] != "events"):
+            return self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+        job = self.server.service.jobs.get(parts[1])
+        if job is None:
+            return self._send_json(404, {"error": f"Unknown job {parts[1]}"})
+        if len(parts) == 2:
+            return self._send_json(200, job.to_dict())
+
+        # Stream the events as JSON lines until the job is finished, the connection is closed when done
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for event in job.stream():
+                self.wfile.write(json.dumps(event, ensure_ascii=False).encode() + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Client stopped streaming job {job.id}")
+
+
+class TranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: TranslationService):
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="turtletranslate-server", description="Serve translate and validate jobs over HTTP, from a shared queue."
+    )
+    parser.add_argument("--bind", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_SERVER", "127.0.0.1"), help="Ollama server")
+    parser.add_argument("-m", "--model", default="gemma3:27b-it-q4_K_M", help="Ollama model to use")
+    parser.add_argument("--fast-model", help="Smaller model to try first, escalating rejected sections to --model")
+    parser.add_argument("--num-ctx", type=int, default=6 * 1024, help="Context size for the model")
+    parser.add_argument("--glossary", help="Glossary of required term translations (JSON object, or CSV/TSV file)")
+    parser.add_argument("--prefix-cache", action="store_true", help="Lay out prompts to maximize prompt cache reuse")
+    parser.add_argument(
+        "--mask", action="store_true", help="Swap URLs, code, HTML and math for placeholders in prompts"
+    )
+    parser.add_argument(
+        "--output-root",
+        default=".",
+        help="Directory jobs may write translations to, relative target filenames are resolved in it (default: .)",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Number of jobs to run concurrently (default: 1)")
+    parser.add_argument("--max-queue", type=int, default=64, help="Queued jobs before rejecting new ones (default: 64)")
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = _build_parser().parse_args(argv)
+
+    import ollama
+
+    service = TranslationService(
+        {
+            "client": ollama.Client(args.host),
+            "model": args.model,
+            "fast_model": args.fast_model,
+            "num_ctx": args.num_ctx,
+            "glossary": Glossary.load(args.glossary) if args.glossary else None,
+            "prefix_cache": args.prefix_cache,
+            "mask_spans": args.mask,
+        },
+        output_root=args.output_root,
+        workers=max(1, args.workers),
+        max_queue=args.max_queue,
+    )
+    service.start()
+    server = TranslationServer((args.bind, args.port), service)
+    logger.info(
+        f"Serving on http://{args.bind}:{args.port} ({args.workers} workers, queue limit {args.max_queue}), "
+        f"writing to {service.output_root}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import json
+import os
+import random
+import re
+import zlib
+from dataclasses import dataclass
+
+from turtletranslate.logger import logger
+
+SHINGLE_SIZE = 5  # Character shingles
+NUM_PERM = 64  # Number of MinHash permutations
+BANDS = 16  # LSH bands, with NUM_PERM // BANDS rows each (candidates from an estimated similarity of ~0.5)
+INDEX_SUFFIX = ".turtleindex"
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)  # Fixed seed, so signatures are stable between runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def index_path(target_filename: str) -> str:
+    """The similarity index lives next to the target file, i.e. docs/index_en.md -> docs/index_en.md.turtleindex"""
+    return f"{target_filename}{INDEX_SUFFIX}"
+
+
+def normalize(text: str) -> str:
+    """Normalize whitespace, so sections only differing in spacing or line wrapping are considered equal."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(normalized: str) -> set[str]:
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i : i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set: set[str]) -> tuple[int, ...]:
+    hashes = [zlib.crc32(s.encode()) for s in shingle_set]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class SimilarMatch:
+    source: str  # The previously translated source section
+    translation: str  # Its approved translation
+    similarity: float  # Jaccard similarity of the shingles
+    normalized_equal: bool  # Whether the sections only differ in whitespace, i.e. the translation can be reused as is
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over previously translated sections, to find the closest prior translation of a section.
+
+    Entries are keyed by section type, so a code fence never matches a paragraph.
+    """
+
+    def __init__(self):
+        self.entries = dict()  # normalized source -> (section type, source, translation)
+        self._buckets = dict()  # (section type, band, band hash) -> set of normalized sources
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _bands(self, signature: tuple[int, ...]):
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            yield band, hash(signature[band * rows : (band + 1) * rows])
+
+    def add(self, source: str, translation: str, section_type: str):
+        key = normalize(source)
+        if key in self.entries:
+            self.entries[key] = (section_type, source, translation)
+            return
+        self.entries[key] = (section_type, source, translation)
+        for band, band_hash in self._bands(minhash(shingles(key))):
+            self._buckets.setdefault((section_type, band, band_hash), set()).add(key)
+
+    def query(self, section: str, section_type: str, threshold: float) -> SimilarMatch:
+        """Find the most similar previously translated section of the same type, or None if none meet the threshold."""
+        key = normalize(section)
+        if key in self.entries and self.entries[key][0] == section_type:
+            _, source, translation = self.entries[key]
+            return SimilarMatch(source, translation, 1.0, True)
+
+        query_shingles = shingles(key)
+        candidates = set()
+        for band, band_hash in self._bands(minhash(query_shingles)):
+            candidates |= self._buckets.get((section_type, band, band_hash), set())
+
+        best = None
+        for candidate in candidates:
+            similarity = jaccard(query_shingles, shingles(candidate))
+            if similarity >= threshold and (best is None or similarity > best.similarity):
+                _, source, translation = self.entries[candidate]
+                best = SimilarMatch(source, translation, similarity, False)
+        return best
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([list(entry) for entry in self.entries.values()], f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityIndex":
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for section_type, source, translation in json.load(f):
+                    index.add(source, translation, section_type)
+        except (OSError, json.JSONDecodeError, ValueError) as e:
+            logger.warning(f"Failed to load similarity index {path}: {e}")
+        return index
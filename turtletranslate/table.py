@@ -0,0 +1,71 @@
+import re
+
+# The delimiter row between the header and the body of a pipe table, i.e. "| --- | :---: |"
+SEPARATOR_RE = re.compile(r"^\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+# Cells that are kept as they are: numbers and versions (with a short unit), inline code, and bare URLs
+VERBATIM_RE = re.compile(r"^(?:v?\d[\d.,:/-]*[a-z]{0,3}%?|`[^`]+`|<?(?:https?|ftp)://\S+>?)$", re.IGNORECASE)
+
+
+def split_row(row: str) -> list[str]:
+    """
+    Split a table row on its pipes, ignoring escaped pipes and pipes inside inline code. The cells keep their
+    surrounding whitespace, and the outer pipes give empty first and last cells, so "|".join() gives the row back.
+    """
+    cells, current, in_code, i = list(), list(), False, 0
+    while i < len(row):
+        ch = row[i]
+        if ch == "\\" and i + 1 < len(row):
+            current.append(row[i : i + 2])
+            i += 2
+            continue
+        if ch == "`":
+            in_code = not in_code
+        if ch == "|" and not in_code:
+            cells.append("".join(current))
+            current = list()
+        else:
+            current.append(ch)
+        i += 1
+    cells.append("".join(current))
+    return cells
+
+
+def needs_translation(text: str) -> bool:
+    text = text.strip()
+    return any(c.isalpha() for c in text) and not VERBATIM_RE.match(text)
+
+
+def cells(table: str) -> list[str]:
+    """The unique cell texts of a table that need translation, in order of appearance."""
+    texts = dict()
+    for row in table.split("\n"):
+        if SEPARATOR_RE.match(row):
+            continue
+        for cell in split_row(row):
+            if needs_translation(cell):
+                texts[cell.strip()] = None
+    return list(texts)
+
+
+def _escape_cell(text: str) -> str:
+    """Keep a translated cell on one line, and escape the pipes the model added outside inline code."""
+    text = re.sub(r"\s*\n\s*", " ", text.strip())
+    return "\\|".join(split_row(text))
+
+
+def rebuild(table: str, translations: dict[str, str]) -> str:
+    """Put the translations (cell text -> translation) in place of the cells, keeping everything else as it is."""
+    rows = list()
+    for row in table.split("\n"):
+        if SEPARATOR_RE.match(row):
+            rows.append(row)
+            continue
+        row_cells = list()
+        for cell in split_row(row):
+            text = cell.strip()
+            if text in translations:
+                start = cell.index(text)
+                cell = cell[:start] + _escape_cell(translations[text]) + cell[start + len(text) :]
+            row_cells.append(cell)
+        rows.append("|".join(row_cells))
+    return "\n".join(rows)
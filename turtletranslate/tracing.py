@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Tracer:
+    """
+    Collect spans of the pipeline stages as Chrome trace events, viewable in chrome://tracing or https://ui.perfetto.dev.
+
+    Spans are recorded per thread, or per asyncio task for steps driven by arun, so the spans of concurrent sections
+    nest on their own track.
+    """
+
+    def __init__(self):
+        self.events = list()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._tracks = dict()  # Thread or task -> (track id, name)
+
+    def _track(self) -> int:
+        key, name = threading.get_ident(), threading.current_thread().name
+        asyncio = sys.modules.get("asyncio")  # Only looked up if the application already imported it
+        if asyncio is not None:
+            try:
+                task = asyncio.current_task()
+            except RuntimeError:
+                task = None  # No event loop running in this thread
+            if task is not None:
+                key, name = id(task), task.get_name()
+        with self._lock:
+            if key not in self._tracks:
+                self._tracks[key] = (len(self._tracks) + 1, name)
+            return self._tracks[key][0]
+
+    @contextmanager
+    def span(self, name: str, **args):
+        track = self._track()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self._pid,
+                "tid": track,
+                "args": args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def save(self, path: str):
+        """Write the trace as Chrome trace JSON (through a temporary file, which is atomically renamed)."""
+        with self._lock:
+            names = [
+                {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": track, "args": {"name": name}}
+                for track, name in self._tracks.values()
+            ]
+            trace = {"traceEvents": names + self.events, "displayTimeUnit": "ms"}
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+        os.replace(f"{path}.tmp", path)
+
+
+_tracer: Tracer = None
+_NO_SPAN = nullcontext()
+
+
+def enable() -> Tracer:
+    """Start recording spans in a new process wide tracer, and return it."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable() -> Tracer:
+    """Stop recording spans, and return the tracer that was recording them (if any)."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def span(name: str, **args):
+    """Context manager recording a span if tracing is enabled, and doing nothing otherwise."""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, **args)
@@ -1,18 +1,19 @@
+import copy
+import fnmatch
 import hashlib
 import json
+import logging
+import threading
 import timeit
-from functools import lru_cache
-
-import markupsafe
-import ollama
 
 from turtletranslate.exceptions import TurtleTranslateException
 from turtletranslate.logger import logger
+from turtletranslate.masking import Masker
 from turtletranslate.models import (
-    SUMMARIZER_CRITIC_SYSTEM,
-    SUMMARIZER_CRITIC_PROMPT,
     SUMMARIZER_WORKER_SYSTEM,
-    SUMMARIZER_WORKER_PROMPT,
+    SUMMARIZER_CHUNK_PROMPT,
+    SUMMARIZER_REDUCE_PROMPT,
+    SUMMARY_CONTEXT,
     TRANSLATION_CRITIC_BLOCKQUOTE_SYSTEM,
     TRANSLATION_CRITIC_BLOCKQUOTE_PROMPT,
     TRANSLATION_CRITIC_ARTICLE_SYSTEM,
@@ -29,17 +30,41 @@ from turtletranslate.models import (
     TRANSLATION_WORKER_CODEFENCE_PROMPT,
     TRANSLATION_WORKER_WILDCARD_SYSTEM,
     TRANSLATION_WORKER_WILDCARD_PROMPT,
+    TRANSLATION_WORKER_TABLE_SYSTEM,
+    TRANSLATION_WORKER_TABLE_PROMPT,
+    TRANSLATION_CRITIC_TABLE_SYSTEM,
+    TRANSLATION_CRITIC_TABLE_PROMPT,
     FRONTMATTER_WORKER_SYSTEM,
     FRONTMATTER_WORKER_PROMPT,
     PREPEND_TRANSLATION_WORKER_SYSTEM,
     PREPEND_TRANSLATION_WORKER_PROMPT,
     PREPEND_TRANSLATION_CRITIC_SYSTEM,
     PREPEND_TRANSLATION_CRITIC_PROMPT,
+    TRANSLATION_UPDATE_SYSTEM,
+    TRANSLATION_UPDATE_PROMPT,
+    TRANSLATION_REVISE_ARTICLE_PROMPT,
+    TRANSLATION_REVISE_BLOCKQUOTE_PROMPT,
+    TRANSLATION_REVISE_CODEFENCE_PROMPT,
+    TRANSLATION_REVISE_WILDCARD_PROMPT,
+    SHARED_PREFIX_SYSTEM,
+    GLOSSARY_CONTEXT,
+    MASK_CONTEXT,
+    PREVALIDATION_NOTES,
+    TABLE_CRITIQUE,
+    VERDICT_PROMPT,
+    VERDICT_REASON_PROMPT,
+    VERDICT_SCHEMA,
+    VERDICT_REASON_SCHEMA,
 )
 from turtletranslate.parameters import DEFAULT_OPTIONS, STRICT, LENIENT, CREATIVE  # noqa: F401
+from turtletranslate.prevalidator import prevalidate, advise, is_low_risk
+from turtletranslate.runner import Gather, Step, run
+from turtletranslate.similarity import SimilarityIndex
+from turtletranslate import table, tracing
 from turtletranslate.tokens import (
     NO_TRANSLATE_TOKEN,
     PREPEND_TOKEN,
+    TABLE_TOKEN,
 )
 from turtletranslate.utils import remove_backslashes, _parse_json_flexibly
 
@@ -65,15 +90,20 @@ TRANSLATE_TYPES = {
         TRANSLATION_CRITIC_BLOCKQUOTE_PROMPT,
         LENIENT,
     ),
-    "summary_critic": (
-        SUMMARIZER_CRITIC_SYSTEM,
-        SUMMARIZER_CRITIC_PROMPT,
-        CREATIVE,
+    "translation_critic_table": (
+        TRANSLATION_CRITIC_TABLE_SYSTEM,
+        TRANSLATION_CRITIC_TABLE_PROMPT,
+        LENIENT,
     ),
     # Generic workers
-    "summary_worker": (
+    "summary_chunk_worker": (
+        SUMMARIZER_WORKER_SYSTEM,
+        SUMMARIZER_CHUNK_PROMPT,
+        STRICT,
+    ),
+    "summary_reduce_worker": (
         SUMMARIZER_WORKER_SYSTEM,
-        SUMMARIZER_WORKER_PROMPT,
+        SUMMARIZER_REDUCE_PROMPT,
         STRICT,
     ),
     "frontmatter_worker": (
@@ -102,6 +132,11 @@ TRANSLATE_TYPES = {
         TRANSLATION_WORKER_BLOCKQUOTE_PROMPT,
         STRICT,
     ),
+    "translation_worker_table": (
+        TRANSLATION_WORKER_TABLE_SYSTEM,
+        TRANSLATION_WORKER_TABLE_PROMPT,
+        STRICT,
+    ),
     "translation_critic_prepend": (
         PREPEND_TRANSLATION_CRITIC_SYSTEM,
         PREPEND_TRANSLATION_CRITIC_PROMPT,
@@ -112,118 +147,430 @@ TRANSLATE_TYPES = {
         PREPEND_TRANSLATION_WORKER_PROMPT,
         STRICT,
     ),
+    # Revise a rejected translation with its critique, with the system of the worker of the same type
+    "translation_revise_wildcard": (
+        TRANSLATION_WORKER_WILDCARD_SYSTEM,
+        TRANSLATION_REVISE_WILDCARD_PROMPT,
+        STRICT,
+    ),
+    "translation_revise_codefence": (
+        TRANSLATION_WORKER_CODEFENCE_SYSTEM,
+        TRANSLATION_REVISE_CODEFENCE_PROMPT,
+        STRICT,
+    ),
+    "translation_revise_article": (
+        TRANSLATION_WORKER_ARTICLE_SYSTEM,
+        TRANSLATION_REVISE_ARTICLE_PROMPT,
+        STRICT,
+    ),
+    "translation_revise_blockquote": (
+        TRANSLATION_WORKER_BLOCKQUOTE_SYSTEM,
+        TRANSLATION_REVISE_BLOCKQUOTE_PROMPT,
+        STRICT,
+    ),
+    # Updates an existing translation of a near-duplicate section
+    "translation_update": (
+        TRANSLATION_UPDATE_SYSTEM,
+        TRANSLATION_UPDATE_PROMPT,
+        STRICT,
+    ),
 }
 
 
-SUMMARY_CACHE = dict()  # Cache for summaries, to avoid re-generating them
-PREPEND_CACHE = dict()  # Cache for prepend data, to avoid re-generating them
+# Generated token budgets for structured critic verdicts
+VERDICT_NUM_PREDICT = 16
+VERDICT_REASON_NUM_PREDICT = 160
+# Counters reported by Ollama that are accumulated in data.prompt_stats
+PROMPT_STATS_KEYS = ("calls", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+# Prompt types given the glossary entries appearing in their section
+GLOSSARY_TYPES = ("translation_worker_", "translation_update", "translation_revise_", "translation_critic_")
+# Section types that are (mostly) kept as they are, so their translations are not checked for glossary terms
+GLOSSARY_UNCHECKED_TYPES = (NO_TRANSLATE_TOKEN, "codefence")
+# Frontmatter key of a translated document holding the checksum of the source frontmatter it was translated from
+FRONTMATTER_CHECKSUM_KEY = "turtletranslate_frontmatter_checksum"
+# Rough number of characters per token, used to estimate the prompt tokens sent when reporting prompt cache reuse
+CHARS_PER_TOKEN = 4
+# Prompt types whose section (and near-duplicate) is masked with mask_spans. Code fences and tables are left alone,
+# their workers only translate comments and cell texts
+MASKED_TYPES = (
+    "translation_worker_article",
+    "translation_worker_blockquote",
+    "translation_worker_wildcard",
+    "translation_worker_prepend",
+    "translation_update",
+    "translation_revise_article",
+    "translation_revise_blockquote",
+    "translation_revise_wildcard",
+)
+MASKED_VALUES = ("section", "previous_section", "previous_translation", "translated_section")
 
 
-@lru_cache
-def _download_model_if_not_exists(client: ollama.Client, model: str):
-    """Issues a pull command to the Ollama API if the model does not exist."""
-    logger.info(f"Checking if model {model} is installed")
-    try:
-        client.show(model)
-        logger.info(f"{model} is installed! Proceeding")
-    except ollama.ResponseError:
-        logger.info(f"{model} was not installed. Downloading...")
-        client.pull(model)
-        logger.info(f"Downloaded {model}")
-
-
-def _prompt(data, token: str) -> ollama.GenerateResponse:
-    """Prompt the Ollama API with the correct system and prompt for the given type (ENUM)."""
-    system = TRANSLATE_TYPES[token][0].format(**data.format())
-    prompt = TRANSLATE_TYPES[token][1].format(**data.format())
+_stats_lock = threading.Lock()
+
+
+def _record_prompt_stats(data, token: str, response, prompt_chars: int = 0, masked_chars: int = 0):
+    """Accumulate the number of calls, tokens and durations reported by Ollama, per prompt type."""
+    with _stats_lock:
+        stats = data.prompt_stats.setdefault(
+            token, {**dict.fromkeys(PROMPT_STATS_KEYS, 0), "prompt_chars": 0, "masked_chars": 0}
+        )
+        stats["calls"] += 1
+        stats["prompt_chars"] += prompt_chars
+        stats["masked_chars"] += masked_chars
+        for key in PROMPT_STATS_KEYS[1:]:
+            stats[key] += getattr(response, key, None) or 0
+
+
+def prompt_cache_report(data) -> dict:
+    """
+    Compare the prompt tokens Ollama actually evaluated with an estimate of the prompt tokens sent. Tokens served from
+    the server's prompt cache are not evaluated again, so the difference is the (estimated) prompt cache reuse.
+    """
+    evaluated = sum(s["prompt_eval_count"] for s in data.prompt_stats.values())
+    sent = sum(s["prompt_chars"] for s in data.prompt_stats.values()) // CHARS_PER_TOKEN
+    return {
+        "prompt_tokens_sent": sent,
+        "prompt_eval_count": evaluated,
+        "prompt_eval_duration": sum(s["prompt_eval_duration"] for s in data.prompt_stats.values()),
+        "reused": max(0.0, 1 - evaluated / sent) if sent else 0.0,
+    }
+
+
+def masking_report(data) -> dict:
+    """Characters (and estimated tokens) kept out of prompts and responses by masking, summed over every prompt type."""
+    masked = sum(s["masked_chars"] for s in data.prompt_stats.values())
+    return {"masked_chars": masked, "tokens_saved": masked // CHARS_PER_TOKEN}
+
+
+def resolve_route(data, token: str) -> dict:
+    """
+    Find the route for a prompt type in data.routes, i.e. {"model": "qwen2.5-coder", "num_ctx": 8192, "options": {}}.
+
+    Routes are keyed by prompt type (TRANSLATE_TYPES keys, i.e. "translation_worker_codefence"), or by a glob pattern
+    such as "translation_critic_*". Exact keys take precedence over patterns, and patterns are tried in order.
+    """
+    if not data.routes:
+        return dict()
+    if token in data.routes:
+        return data.routes[token]
+    for pattern, route in data.routes.items():
+        if fnmatch.fnmatchcase(token, pattern):
+            return route
+    return dict()
+
+
+def _prompt(
+    data,
+    token: str,
+    values: dict = None,
+    suffix: str = "",
+    format: dict = None,
+    options: dict = None,
+    model: str = None,
+) -> Step:
+    """
+    Prompt the Ollama API with the correct system and prompt for the given type (ENUM), returning the response.
+    :param data: The TurtleTranslator instance.
+    :param token: The prompt type, a key of TRANSLATE_TYPES.
+    :param values: Values to format the templates with (defaults to data.format()).
+    :param suffix: Text to append to the prompt, i.e. answer format instructions.
+    :param format: JSON schema to constrain the response with.
+    :param options: Options overriding the defaults for the prompt type, i.e. num_predict.
+    :param model: Model overriding the routed model, i.e. the fast model of a tiered translation.
+    """
+    values = data.format() if values is None else values
+    # Only the glossary entries that appear in the section are given to translators and critics
+    glossary = ""
+    if data.glossary and token.startswith(GLOSSARY_TYPES) and isinstance(values.get("section"), str):
+        glossary = data.glossary.format(values["section"])
+    glossary = GLOSSARY_CONTEXT.format(glossary=glossary) if glossary else ""
+
+    masker, masked_chars = None, 0
+    if data.mask_spans and token in MASKED_TYPES:
+        masker = Masker()
+        template = TRANSLATE_TYPES[token][1]
+        masked = {
+            key: masker.mask(values[key], expect=key == "section")
+            for key in MASKED_VALUES
+            if f"{{{key}}}" in template and isinstance(values.get(key), str) and values[key]
+        }
+        masked_chars = sum(len(values[key]) - len(text) for key, text in masked.items())
+        values = {**values, **masked}
+        if masker.spans:
+            glossary += MASK_CONTEXT
+
+    if data.prefix_cache:
+        # Static per-run content forms a shared system prefix, then type instructions, and the section last
+        system = SHARED_PREFIX_SYSTEM.format(**values)
+        if values.get("summary"):
+            system += SUMMARY_CONTEXT.format(**values)
+        instructions = TRANSLATE_TYPES[token][0].format(**values) + glossary
+        prompt = f"{instructions}\n\n{TRANSLATE_TYPES[token][1].format(**values)}{suffix}"
+    else:
+        system = TRANSLATE_TYPES[token][0].format(**values) + glossary
+        if values.get("summary") and token.startswith(
+            ("translation_worker_", "translation_update", "translation_revise_")
+        ):
+            system += SUMMARY_CONTEXT.format(**values)
+        prompt = TRANSLATE_TYPES[token][1].format(**values) + suffix
     opts = TRANSLATE_TYPES[token][2]
-    _download_model_if_not_exists(data.client, data.model)
+    route = resolve_route(data, token)
+    model = model or route.get("model") or data.model
 
-    logger.debug("Prompt: " + prompt.replace("\n", "\\n").replace("\t", "\\t"))
-    logger.debug("System: " + system.replace("\n", "\\n").replace("\t", "\\t"))
+    if logger.level == logging.DEBUG:  # The prompts are long, only escape them if they are logged
+        logger.debug("Prompt: " + prompt.replace("\n", "\\n").replace("\t", "\\t"))
+        logger.debug("System: " + system.replace("\n", "\\n").replace("\t", "\\t"))
 
     logger.debug("Querying Ollama")
     time = timeit.default_timer()
     options = {
-        "num_ctx": data.num_ctx,
+        "num_ctx": route.get("num_ctx") or data.num_ctx,
         **opts,
+        **route.get("options", dict()),
+        **(options or dict()),
     }
-    response = data.client.generate(model=data.model, prompt=prompt, system=system, options=options)
+    with tracing.span(token, model=model):
+        response = yield dict(model=model, prompt=prompt, system=system, options=options, format=format)
     logger.debug(f"Responded in {timeit.default_timer() - time:.2f}s")
-    logger.debug(f"Response: {response.response}")
+    if logger.level == logging.DEBUG:
+        logger.debug(f"Response: {response.response}")
+    if masker:
+        text, data._mask_problems = masker.unmask(response.response)
+        masked_chars += len(text) - len(response.response)
+        response.response = text
+    _record_prompt_stats(data, token, response, prompt_chars=len(system) + len(prompt), masked_chars=masked_chars)
     return response
 
 
-@lru_cache
+def _legacy_verdict(text: str) -> bool:
+    """Guess the verdict of a free-form critic response."""
+    return text.lower().strip().startswith("yes") or "no" not in text.lower().split()
+
+
+def parse_verdict(text: str):
+    """Parse a structured verdict, returning True/False, or None if the response is not a valid verdict."""
+    try:
+        verdict = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(verdict, dict) and isinstance(verdict.get("approved"), bool):
+        return verdict["approved"]
+    return None
+
+
+def critic_verdict(data, token: str, values: dict = None, notes: list[str] = None) -> tuple[bool, str]:
+    """Ask a critic for a verdict with the synchronous client, see _critic_verdict."""
+    return run(data, _critic_verdict(data, token, values=values, notes=notes))
+
+
+def _critic_verdict(data, token: str, values: dict = None, notes: list[str] = None) -> Step:
+    """
+    Ask a critic for a verdict, returning whether it approved and the reason if it did not.
+
+    With structured verdicts the critic is constrained to {"approved": bool} with a tiny num_predict, and a reason is
+    only requested after a rejection. If the server or model ignores the format, the verdict is guessed from the
+    free-form text instead, but a JSON verdict that can not be parsed (i.e. cut off) counts as a rejection without a
+    reason, so the section is translated again. Without structured verdicts, the verdict is guessed from free-form text.
+    Notes (see prevalidator.advise) are added to the prompt for the critic to judge.
+    """
+    notes = PREVALIDATION_NOTES.format(notes=" ".join(notes)) if notes else ""
+    if not data.structured_verdicts:
+        text = (yield from _prompt(data, token, values=values, suffix=notes)).response.strip()
+        return _legacy_verdict(text), text
+
+    response = yield from _prompt(
+        data,
+        token,
+        values=values,
+        suffix=notes + VERDICT_PROMPT,
+        format=VERDICT_SCHEMA,
+        options={"num_predict": VERDICT_NUM_PREDICT},
+    )
+    approved = parse_verdict(response.response)
+    if approved is None and not response.response.strip().startswith("{"):
+        # Free-form text, the server or model does not support structured outputs
+        logger.warning("The critic did not answer with a structured verdict, guessing it from the text instead")
+        approved = _legacy_verdict(response.response)
+    if approved is None:
+        # Cut off by num_predict, it is not an approval
+        logger.warning(f"Could not parse the structured verdict {response.response.strip()[:80]!r}, rejecting it")
+        return False, ""
+    if approved:
+        return True, ""
+
+    response = yield from _prompt(
+        data,
+        token,
+        values=values,
+        suffix=notes + VERDICT_REASON_PROMPT,
+        format=VERDICT_REASON_SCHEMA,
+        options={"num_predict": VERDICT_REASON_NUM_PREDICT},
+    )
+    try:
+        reason = str(json.loads(response.response)["reason"])
+    except (json.JSONDecodeError, KeyError, TypeError):
+        reason = response.response.strip()
+    return False, reason
+
+
 def hash_document(document: str, num_ctx: int) -> str:
     """A simple hash function to hash the document and the number of context tokens, for caching purposes."""
     return hashlib.sha256(f"{document}-{num_ctx}".encode()).hexdigest()
 
 
-def _approve_summary(data) -> bool:
-    """Approve the summary, or retry if it does not meet the criteria."""
-    if not data.review:
-        return True
-    logger.info("Reviewing summary")
-    text = _prompt(data, "summary_critic").response
+def _ends_summary_chunk(content: str, target: int) -> bool:
+    """Whether a section ends its chunk, with a chance proportional to its length, decided by its content alone."""
+    return int(generate_checksum(content), 16) / 16**16 < len(content) / target
 
-    if text.lower().strip().startswith("yes"):
-        data._critique = ""
-        return True
-    data._critique = text
-    logger.error(f"Summary did not meet the criteria. Reason: {text}")
 
+def _summary_chunks(data) -> list[str]:
+    """
+    Group consecutive translatable sections into chunks of about a quarter of the context window (~4 chars per token).
 
-def _generate_summary(data, _attempts: int = 0) -> str:
-    """Internal function to generate a summary, with a maximum number of attempts."""
-    if _attempts >= data._max_attempts:
-        logger.error(f"Could not generate summary after {_attempts} attempts.")
-        raise TurtleTranslateException(f"Could not generate summary after {_attempts} attempts.")
+    Chunk boundaries are picked by the content of the section before them (see _ends_summary_chunk), not by the size
+    of everything before them, so an edit only changes the chunk of the edited section, and every other chunk keeps
+    its cached summary. A chunk is also ended before it outgrows half of the context window.
+    """
+    budget = data.num_ctx * 2
+    chunks, current = list(), ""
+    for section in data._sections:
+        token, content = list(section.items())[0]
+        if token in (PREPEND_TOKEN, NO_TRANSLATE_TOKEN):
+            continue
+        if current and len(current) + len(content) > budget:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{content}" if current else content
+        if _ends_summary_chunk(content, budget // 2):
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _summarize(data, token: str, text: str) -> Step:
+    """Summarize a chunk of the document (or a group of partial summaries), caching the result by its content."""
+    key = f"{token}:{hash_document(data.source_language + text, data.num_ctx)}"
+    summary = data.cache.get(key)
+    if summary is not None:
+        return summary
+    summary = (yield from _prompt(data, token, values={**data.format(), "document": text})).response.strip()
+    data.cache.set(key, summary)
+    return summary
 
-    attempt_txt = f"\033[34m(Attempt {_attempts + 1}/{data._max_attempts})\033[0m"
-    logger.info(f"Generating summary. {attempt_txt}")
 
-    data._summary = _prompt(data, "summary_worker").response.rstrip()
+def _reduce_summaries(data, summaries: list[str]) -> Step:
+    """Combine partial summaries into one, in groups that fit the context window if there are too many of them."""
+    if len(summaries) == 1:
+        return summaries[0]
+    budget = data.num_ctx * 2
+    groups, current = list(), list()
+    for summary in summaries:
+        # Groups always get at least two summaries, so every round reduces the number of summaries
+        if len(current) >= 2 and sum(len(s) for s in current) + len(summary) > budget:
+            groups.append(current)
+            current = list()
+        current.append(summary)
+    groups.append(current)
 
-    if not _approve_summary(data):
-        return _generate_summary(data, _attempts + 1)
-    logger.info("Summary generated successfully!")
-    return data._summary
+    def reduce(group: list[str]) -> Step:
+        if len(group) == 1:
+            return group[0]
+        return (yield from _summarize(data, "summary_reduce_worker", "\n\n".join(f"- {s}" for s in group)))
+
+    if len(groups) == 1:
+        return (yield from reduce(groups[0]))
+    reduced = yield Gather([reduce(group) for group in groups], workers=data.summary_workers)
+    return (yield from _reduce_summaries(data, reduced))
 
 
 def generate_summary(data) -> str:
-    """Generate a summary of the document in order to give some context to the translator, then cache it."""
-    if hash_document(data.document, data.num_ctx) in SUMMARY_CACHE:
+    """Generate a summary of the document with the synchronous client, see _generate_summary."""
+    return run(data, _generate_summary(data))
+
+
+def _generate_summary(data) -> Step:
+    """
+    Generate a summary of the document in order to give some context to the translator, then cache it.
+
+    The document is split into chunks of sections that are summarized concurrently, and then reduced into a single
+    summary. Partial summaries are cached by their content, so an edit only recomputes the affected chunk.
+    """
+    key = f"summary:{hash_document(data.document, data.num_ctx)}"
+    summary = data.cache.get(key)
+    if summary is not None:
         logger.debug("Using cached summary")
-        return SUMMARY_CACHE[hash_document(data.document, data.num_ctx)]
-    summary = _generate_summary(data)
-    SUMMARY_CACHE[hash_document(data.document, data.num_ctx)] = summary
+        data._summary = summary
+        return summary
+
+    chunks = _summary_chunks(data)
+    if not chunks:
+        return ""
+    logger.info(f"Generating summary from {len(chunks)} chunks")
+    time = timeit.default_timer()
+    partial = yield Gather(
+        [_summarize(data, "summary_chunk_worker", chunk) for chunk in chunks], workers=data.summary_workers
+    )
+    summary = yield from _reduce_summaries(data, partial)
+    logger.info(f"Summary generated in {timeit.default_timer() - time:.2f}s")
+
+    data._summary = summary
+    data.cache.set(key, summary)
     return summary
 
 
-def _approve_translation(data, token) -> bool:
+def _prevalidate_translation(data, original: str, translated: str, token: str) -> bool:
+    """
+    Run the deterministic checks before any critic, storing the problems as the critique if there are any. Without
+    review every translation is accepted as it is, only the placeholders lost by the worker are still retried.
+    """
+    problems = list()
+    if data.review and data.prevalidate:
+        problems += prevalidate(original, translated, token, data.target_language)
+    if data.review and data.glossary and token not in GLOSSARY_UNCHECKED_TYPES:
+        problems += data.glossary.check(original, translated)
+    # Placeholders the worker lost or duplicated, the spans are restored from them so they are not checked otherwise
+    problems += data._mask_problems or list()
+    data._mask_problems = None
+    if problems:
+        data._critique = " ".join(problems)
+        logger.error(f"Translation failed prevalidation. Reason: {data._critique}")
+        return False
+    return True
+
+
+def _approve_translation(data, token) -> Step:
     """Approve the translation, or retry if it does not meet the criteria."""
+    if not _prevalidate_translation(data, data._section, data._translated_section, token):
+        return False
     if not data.review:
         return True
+    if data.prevalidate and data.auto_approve_low_risk and is_low_risk(data._section, token):
+        logger.debug("Approving low risk translation without review")
+        data._critique = ""
+        return True
     logger.debug("Reviewing translation")
-    text = _prompt(data, f"translation_critic_{token}").response
+    notes = advise(data._section, data._translated_section, token) if data.prevalidate else None
+    approved, reason = yield from _critic_verdict(data, f"translation_critic_{token}", notes=notes)
 
-    if text.lower().strip().startswith("yes") or "no" not in text.lower().split():
+    if approved:
         data._critique = ""
         return True
-    data._critique = text
-    logger.error(f"Translation did not meet the criteria. Reason: {text}")
+    data._critique = reason
+    logger.error(f"Translation did not meet the criteria. Reason: {reason}")
 
 
 def _get_cached_prepend(data) -> dict[str, str]:
     """Cache the prepend data to avoid re-generating it, since we will always use the same prepend."""
-    if hash_document(data.prepend_md + data.target_language, data.num_ctx) in PREPEND_CACHE:
+    cached = data.cache.get(f"prepend:{hash_document(data.prepend_md + data.target_language, data.num_ctx)}")
+    if cached is not None:
         logger.debug("Using cached prepend")
-        return PREPEND_CACHE[hash_document(data.prepend_md + data.target_language, data.num_ctx)]
+        return dict(cached)
 
 
 def _cache_prepend(data, prepend_section: dict[str, str]):
-    PREPEND_CACHE[hash_document(data.prepend_md + data.target_language, data.num_ctx)] = prepend_section
+    data.cache.set(f"prepend:{hash_document(data.prepend_md + data.target_language, data.num_ctx)}", prepend_section)
 
 
 def generate_checksum(content: str) -> str:
@@ -231,8 +578,20 @@ def generate_checksum(content: str) -> str:
     return hashlib.md5(content.encode()).hexdigest()[:16]  # 16-character checksum is sufficient
 
 
-def _translate_section(data, _attempts: int = 0, _current_section: int = 1) -> dict[str, str]:
-    """Internal function to translate a section, with a maximum number of attempts."""
+def frontmatter_checksum(frontmatter: dict) -> str:
+    """Checksum of the translatable frontmatter of a source document, so a scan can tell if its translation is stale."""
+    return generate_checksum(json.dumps(frontmatter, sort_keys=True, ensure_ascii=False, default=str))
+
+
+def _translate_section(
+    data, _attempts: int = 0, _current_section: int = 1, _draft: str = None, _revisions: int = 0
+) -> Step:
+    """
+    Internal function to translate a section, with a maximum number of attempts.
+
+    A rejected translation is passed back as the draft, and revised with its critique (up to data.revisions times in a
+    row) instead of translating the section again from scratch.
+    """
     if _attempts >= data._max_attempts:
         logger.error(f"Could not translate section after {_attempts} attempts.")
         raise TurtleTranslateException(f"Could not translate section after {_attempts} attempts.")
@@ -253,6 +612,7 @@ def _translate_section(data, _attempts: int = 0, _current_section: int = 1) -> d
         logger.info(f"Reusing existing translation for {section_txt} {type_txt} (checksum: {checksum})")
         existing_content = data._existing_sections[checksum]
         data._translated_section = {token: existing_content, "checksum": checksum}
+        data.reuse_stats["exact"] += 1
         return data._translated_section
 
     logger.info(f"Translating {section_txt} {attempt_txt} {type_txt}")
@@ -270,29 +630,216 @@ def _translate_section(data, _attempts: int = 0, _current_section: int = 1) -> d
         data._translated_section = {token: section, "checksum": checksum}
         return {token: section, "checksum": checksum}
 
-    data._section = section
-    translated_section = _prompt(data, f"translation_worker_{token}").response.rstrip()
-    data._translated_section = translated_section
+    # Look for a near-duplicate among previous translations, only on the first attempt so a rejected update falls
+    # back to translating the section from scratch
+    match = None
+    if _attempts == 0 and data.similarity_threshold is not None and data.similarity_index:
+        match = data.similarity_index.query(section, token, data.similarity_threshold)
+    if match and match.normalized_equal:
+        logger.info(f"Reusing near-duplicate translation for {section_txt} {type_txt} (whitespace changes only)")
+        data._translated_section = {token: match.translation, "checksum": checksum}
+        data.reuse_stats["normalized"] += 1
+        return data._translated_section
+    if match and token == TABLE_TOKEN:
+        match = None  # Tables are rebuilt from their (cached) cell translations instead of being updated as a whole
+
+    # With a fast model, the first attempts are made with it, and only rejected sections escalate to data.model
+    tier = "fast" if data.fast_model and _attempts < data.fast_model_attempts else "main"
+    model = data.fast_model if tier == "fast" else None
+    tier_stats = data.tier_stats.setdefault(token, _new_tier_stats())
 
-    if not _approve_translation(data, token):
+    data._section = section
+    with tracing.span("attempt", attempt=_attempts + 1, tier=tier):
+        time = timeit.default_timer()
+        if match:
+            logger.info(f"Updating near-duplicate translation ({match.similarity:.0%} similar)")
+            data._previous_section, data._previous_translation = match.source, match.translation
+            translated_section = (yield from _prompt(data, "translation_update", model=model)).response.rstrip()
+        elif token == TABLE_TOKEN:
+            translated_section, cells = yield from _translate_table(data, section, model=model, retry=_attempts > 0)
+        elif _draft is not None:
+            logger.info(f"Revising the rejected translation ({_revisions}/{data.revisions})")
+            data._translated_section = _draft
+            translated_section = (yield from _prompt(data, f"translation_revise_{token}", model=model)).response
+            translated_section = translated_section.rstrip()
+        else:
+            token_type = f"translation_worker_{token}"
+            translated_section = (yield from _prompt(data, token_type, model=model)).response.rstrip()
+        data._translated_section = translated_section
+        tier_stats[tier]["calls"] += 1
+        tier_stats[tier]["seconds"] += timeit.default_timer() - time
+        approved = translated_section is not None and (yield from _approve_translation(data, token))
+
+    if not approved:
         data._section = original_section
-        return _translate_section(data, _attempts + 1, _current_section=_current_section)
+        if tier == "fast" and _attempts + 1 == data.fast_model_attempts:
+            logger.info(f"Escalating {type_txt} to {data.model}")
+            tier_stats["escalated"] += 1
+        # Revise the rejected translation if the critic said what is wrong with it, otherwise start over
+        revise = (
+            _revisions < data.revisions
+            and translated_section
+            and data._critique
+            and f"translation_revise_{token}" in TRANSLATE_TYPES
+        )
+        return (
+            yield from _translate_section(
+                data,
+                _attempts + 1,
+                _current_section=_current_section,
+                _draft=translated_section if revise else None,
+                _revisions=_revisions + 1 if revise else 0,
+            )
+        )
 
     logger.debug("Section translated successfully!")
+    tier_stats[tier]["approved"] += 1
     data._translated_section = {token: translated_section, "checksum": checksum}
+    data.reuse_stats["updated" if match else "translated"] += 1
+    if data._journal:
+        data._journal.append(checksum, token, translated_section)
     # Cache the prepend data
     if token == PREPEND_TOKEN:
         _cache_prepend(data, data._translated_section)
+    # Cache the cells of approved tables only, so a rejected table is translated again from scratch
+    if token == TABLE_TOKEN:
+        for text, translation in cells.items():
+            data.cache.set(_table_cell_cache_key(data, text), translation)
     return data._translated_section
 
 
+def _table_cell_cache_key(data, text: str) -> str:
+    return (
+        "table_cell:" + hashlib.sha256(f"{data.source_language}\0{data.target_language}\0{text}".encode()).hexdigest()
+    )
+
+
+def _translate_table(data, section: str, model: str = None, retry: bool = False) -> Step:
+    """
+    Translate a table cell by cell, returning the rebuilt table and the cells translated by the model.
+
+    Only the unique cells with text are translated, in one request constrained to a JSON object of exactly those cells,
+    and the table is rebuilt around them, so its structure can not break. Cells translated before (i.e. "Yes", "No")
+    come from the cache, unless the table is retried after a rejection, in which case the critique is passed along so
+    the same cells are not sent blindly again. Returns None as the table if the response could not be parsed.
+    """
+    translations, untranslated = dict(), list()
+    for text in table.cells(section):
+        cached = None if retry else data.cache.get(_table_cell_cache_key(data, text))
+        if cached is not None:
+            translations[text] = cached
+        else:
+            untranslated.append(text)
+    if not untranslated:
+        return table.rebuild(section, translations), dict()
+
+    keys = [str(i) for i in range(1, len(untranslated) + 1)]
+    values = {**data.format(), "cells": json.dumps(dict(zip(keys, untranslated)), ensure_ascii=False, indent=2)}
+    suffix = TABLE_CRITIQUE.format(critique=data._critique) if retry and data._critique else ""
+    response = yield from _prompt(
+        data, "translation_worker_table", values=values, suffix=suffix, format=frontmatter_schema(keys), model=model
+    )
+    text = response.response
+    try:
+        cells = json.loads(text[text.find("{") : text.rfind("}") + 1] or text)  # Without a fenced code block around it
+        if not isinstance(cells, dict) or set(keys) - set(cells) or not all(isinstance(cells[k], str) for k in keys):
+            raise SyntaxError("Expected a JSON object with a string for every cell")
+    except (json.JSONDecodeError, SyntaxError) as e:
+        data._critique = f"The table cells could not be parsed: {e}"
+        logger.error(f"Failed to decode table cells: {e}")
+        return None, dict()
+
+    new = {text: cells[key] for key, text in zip(keys, untranslated)}
+    return table.rebuild(section, {**translations, **new}), new
+
+
+def _new_tier_stats() -> dict:
+    return {
+        "fast": {"calls": 0, "approved": 0, "seconds": 0.0},
+        "main": {"calls": 0, "approved": 0, "seconds": 0.0},
+        "escalated": 0,
+    }
+
+
+def tier_report(data) -> dict[str, dict]:
+    """
+    Summarize the tiered translation per section type: the escalation rate, and the estimated time saved compared to
+    translating every section with data.model (based on the average time per call of each model, across all section
+    types if a type has no calls to one of the models).
+    """
+
+    def average(tier: str, stats: list[dict]) -> float:
+        calls = sum(s[tier]["calls"] for s in stats)
+        return sum(s[tier]["seconds"] for s in stats) / calls if calls else None
+
+    all_stats = list(data.tier_stats.values())
+    report = dict()
+    for token, stats in data.tier_stats.items():
+        fast = stats["fast"]
+        tried_fast = fast["approved"] + stats["escalated"]
+        avg_fast = average("fast", [stats]) or average("fast", all_stats)
+        avg_main = average("main", [stats]) or average("main", all_stats)
+        time_saved = None
+        if avg_fast is not None and avg_main is not None:
+            # Approved fast sections would have cost a main call instead, and every fast call was paid for
+            time_saved = fast["approved"] * avg_main - fast["calls"] * avg_fast
+        report[token] = {
+            "fast_approved": fast["approved"],
+            "escalated": stats["escalated"],
+            "escalation_rate": stats["escalated"] / tried_fast if tried_fast else 0.0,
+            "time_saved": time_saved,
+        }
+    return report
+
+
 def translate_sections(data) -> list[dict[str, str]]:
-    """Translate all sections in the document, one by one"""
+    """Translate all sections in the document with the synchronous client, see _translate_sections."""
+    return run(data, _translate_sections(data))
+
+
+def _translate_sections(data) -> Step:
+    """Translate all sections in the document, one by one with run, or concurrently with arun"""
     data._translated_sections = []
+    data.reuse_stats = {"exact": 0, "normalized": 0, "updated": 0, "translated": 0}
+    data.tier_stats = dict()
+    next_index = SimilarityIndex() if data.similarity_threshold is not None else None
+
+    # In prefix cache mode, sections of the same type are translated back to back, so consecutive requests share the
+    # longest possible prompt prefix. The translated sections are put back in document order afterwards.
+    order = list(range(len(data._sections)))
+    if data.prefix_cache:
+        order.sort(key=lambda i: list(data._sections[i].keys())[0])
+
+    def translate_section(i: int) -> Step:
+        # Each section gets its own view of data, so concurrent sections do not share the section being translated,
+        # its draft or its critique (the caches, journal and stats are shared)
+        view = copy.copy(data)
+        view._section = data._sections[i]
+        with tracing.span("section", index=i, type=list(view._section.keys())[0]):
+            translated = yield from _translate_section(view, _current_section=i + 1)
+        if data.on_section:
+            data.on_section(i, translated)
+        return translated
+
+    # The sections are independent, so arun translates them concurrently (bounded by its semaphore), while run keeps
+    # translating them one by one, in order
+    translated_sections = dict(zip(order, (yield Gather([translate_section(i) for i in order], workers=1))))
     for i, section in enumerate(data._sections):
-        data._section = section
-        data._translated_sections.append(_translate_section(data, _current_section=i + 1))
-
+        token, content = list(section.items())[0]
+        if next_index is not None and token not in (NO_TRANSLATE_TOKEN, PREPEND_TOKEN):
+            next_index.add(content, translated_sections[i][token], token)
+    data._translated_sections = [translated_sections[i] for i in range(len(data._sections))]
+
+    if next_index is not None:
+        data.similarity_index = next_index
+    logger.info(", ".join(f"{count} {kind}" for kind, count in data.reuse_stats.items()) + " sections")
+    if data.fast_model:
+        for token, report in tier_report(data).items():
+            time_saved = "n/a" if report["time_saved"] is None else f"{report['time_saved']:.2f}s"
+            logger.info(
+                f"\033[35m{token}\033[0m: {report['fast_approved']} approved by {data.fast_model}, "
+                f"{report['escalated']} escalated ({report['escalation_rate']:.0%}), time saved: {time_saved}"
+            )
     return data._translated_sections
 
 
@@ -322,31 +869,101 @@ def extrapolate_json(text: str) -> dict:
         raise SyntaxError("Expected a JSON object")
 
     # --- Step 5: Sanitize and stringify keys/values ---
-    return {str(k): remove_backslashes(str(markupsafe.escape(v))) for k, v in obj.items()}
+    return {str(k): remove_backslashes(_escape(v)) for k, v in obj.items()}
+
+
+def _escape(value) -> str:
+    import markupsafe
+
+    return str(markupsafe.escape(value))
 
 
-def translate_frontmatter(data, _attempts: int = 0) -> dict:
-    """Translate the relevant frontmatter keys (TRANSLATABLE_FRONTMATTER_KEYS) in the frontmatter."""
+def _frontmatter_cache_key(data, key: str, value: str) -> str:
+    return (
+        "frontmatter:"
+        + hashlib.sha256(f"{data.source_language}\0{data.target_language}\0{key}\0{value}".encode()).hexdigest()
+    )
+
+
+def frontmatter_schema(keys) -> dict:
+    """JSON schema requiring exactly the given frontmatter keys, with string values."""
+    return {
+        "type": "object",
+        "properties": {key: {"type": "string"} for key in keys},
+        "required": list(keys),
+        "additionalProperties": False,
+    }
+
+
+def _parse_frontmatter_response(text: str, keys) -> dict:
+    """Parse the (schema constrained) frontmatter response, falling back to extrapolate_json for free-form output."""
+    try:
+        obj = json.loads(text)
+        if not isinstance(obj, dict):
+            raise SyntaxError("Expected a JSON object")
+        new_fm = {str(k): remove_backslashes(_escape(v)) for k, v in obj.items()}
+    except json.JSONDecodeError:
+        new_fm = extrapolate_json(text)
+    missing = set(keys) - set(new_fm.keys())
+    if missing:
+        raise SyntaxError(f"Missing frontmatter keys: {', '.join(sorted(missing))}")
+    return new_fm
+
+
+def translate_frontmatter(data) -> dict:
+    """Translate the frontmatter with the synchronous client, see _translate_frontmatter."""
+    return run(data, _translate_frontmatter(data))
+
+
+def _translate_frontmatter(data, _attempts: int = 0) -> Step:
+    """
+    Translate the relevant frontmatter keys (TRANSLATABLE_FRONTMATTER_KEYS) in the frontmatter.
+
+    Each (key, value, language) translation is cached, so only values that have not been translated before are sent
+    to the model, constrained by a JSON schema of exactly those keys.
+    """
     if not data.frontmatter:
         logger.debug("No frontmatter to translate")
         return dict()
     if _attempts >= data._max_attempts:
         logger.error(f"Could not translate frontmatter after {_attempts} attempts.")
         raise TurtleTranslateException(f"Could not translate frontmatter after {_attempts} attempts.")
+
+    translated, untranslated = dict(), dict()
+    for key, value in data.frontmatter.items():
+        if not isinstance(value, str):
+            continue  # Only string values can be translated, anything else is kept as is
+        cached = data.cache.get(_frontmatter_cache_key(data, key, value))
+        if cached is not None:
+            translated[key] = cached
+        else:
+            untranslated[key] = value
+    if not untranslated:
+        logger.debug("Using cached frontmatter translation")
+        data.translated_frontmatter = translated
+        return data.translated_frontmatter
+
     attempt_txt = f"\033[34m(Attempt {_attempts + 1}/{data._max_attempts})\033[0m"
     logger.info(f"Translating frontmatter {attempt_txt}")
+    values = {**data.format(), "frontmatter": json.dumps(untranslated, ensure_ascii=False, indent=2)}
     try:
-        new_fm = extrapolate_json(_prompt(data, "frontmatter_worker").response)
-        data.translated_frontmatter = new_fm
+        response = yield from _prompt(
+            data, "frontmatter_worker", values=values, format=frontmatter_schema(untranslated)
+        )
+        new_fm = _parse_frontmatter_response(response.response, untranslated.keys())
         for key in new_fm.keys():
-            if key not in data.frontmatter.keys():
+            if key not in untranslated.keys():
                 logger.error(
                     f"Translated frontmatter key {key} does not exist in original frontmatter (AI Hallucination)"
                 )
-                return translate_frontmatter(data, _attempts + 1)
-    except (json.JSONDecodeError, SyntaxError):
-        logger.error("Failed to decode JSON response")
-        return translate_frontmatter(data, _attempts + 1)
+                return (yield from _translate_frontmatter(data, _attempts + 1))
+    except (json.JSONDecodeError, SyntaxError) as e:
+        logger.error(f"Failed to decode JSON response: {e}")
+        return (yield from _translate_frontmatter(data, _attempts + 1))
+
+    for key, value in new_fm.items():
+        data.cache.set(_frontmatter_cache_key(data, key, untranslated[key]), value)
+    data.translated_frontmatter = {**translated, **new_fm}
 
     # TODO: Reviewing the frontmatter translation, might not be necessary
     return data.translated_frontmatter
@@ -354,13 +971,20 @@ def translate_frontmatter(data, _attempts: int = 0) -> dict:
 
 def translate(data) -> str:
     """The only function you need to call to translate a document, with a TurtleTranslateData object as input."""
+    return run(data, _translate(data))
+
+
+def _translate(data) -> Step:
+    """Translate a document (a step, driven by run() or arun())."""
     logger.debug(f"Translating document from {data.source_language} to {data.target_language}")
-    _download_model_if_not_exists(data.client, data.model)
     time = timeit.default_timer()
-    # TODO: Use a "context summary" to improve contextual translations
-    # generate_summary(data)
-    translate_frontmatter(data)
-    translate_sections(data)
+    if data.summarize:
+        with tracing.span("summary"):
+            yield from _generate_summary(data)
+    with tracing.span("frontmatter"):
+        yield from _translate_frontmatter(data)
+    with tracing.span("sections", count=len(data._sections)):
+        yield from _translate_sections(data)
     finish_time = timeit.default_timer() - time
 
     stats = dict()
@@ -371,8 +995,22 @@ def translate(data) -> str:
             "turtletranslate_source_language": data.source_language,
             "turtletranslate_target_language": data.target_language,
         }
+        if data.frontmatter:
+            stats[FRONTMATTER_CHECKSUM_KEY] = frontmatter_checksum(data.frontmatter)
 
     logger.info(f"Translation done in \033[35m{finish_time:.2f}s\033[0m!")
+    if data.prefix_cache:
+        report = prompt_cache_report(data)
+        logger.info(
+            f"Evaluated {report['prompt_eval_count']} of ~{report['prompt_tokens_sent']} prompt tokens "
+            f"in {report['prompt_eval_duration'] / 1e9:.2f}s (~{report['reused']:.0%} reused from the prompt cache)"
+        )
+
+    if data.mask_spans:
+        report = masking_report(data)
+        logger.info(
+            f"Masking kept {report['masked_chars']} characters (~{report['tokens_saved']} tokens) from the model"
+        )
 
     if data.write_file and data.target_filename:
         return data.write_translated_document(extra_frontmatter=stats)
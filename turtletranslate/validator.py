@@ -1,10 +1,16 @@
 from turtletranslate.logger import logger
 
-from turtletranslate.translate import TRANSLATE_TYPES
-import timeit
+from turtletranslate.prevalidator import prevalidate, advise, is_low_risk
+from turtletranslate.runner import Step, run
+from turtletranslate.translate import GLOSSARY_UNCHECKED_TYPES, _critic_verdict
 
 
 def validate(data, original_content: str, translated_content: str, section_type: str) -> bool:
+    """Validate translated content with the synchronous client, see _validate."""
+    return run(data, _validate(data, original_content, translated_content, section_type))
+
+
+def _validate(data, original_content: str, translated_content: str, section_type: str) -> Step:
     """
     Validate translated content using critique models.
 
@@ -18,7 +24,17 @@ def validate(data, original_content: str, translated_content: str, section_type:
         True if validation passes, False otherwise
     """
 
-    # TODO: We currently reuse a lot of code, consider refactoring to avoid duplication
+    # Cheap deterministic checks first, so obviously broken translations never reach the critic
+    problems = list()
+    if data.prevalidate:
+        problems += prevalidate(original_content, translated_content, section_type, data.target_language)
+    if data.glossary and section_type not in GLOSSARY_UNCHECKED_TYPES:
+        problems += data.glossary.check(original_content, translated_content)
+    if problems:
+        logger.error(f"Translation failed prevalidation. Reason: {' '.join(problems)}")
+        return False
+    if data.prevalidate and data.auto_approve_low_risk and is_low_risk(original_content, section_type):
+        return True
 
     prompt_data = {
         "source_language": data.source_language,
@@ -26,24 +42,10 @@ def validate(data, original_content: str, translated_content: str, section_type:
         "section": original_content,
         "translated_section": translated_content,
     }
-    token = f"translation_critic_{section_type}"
-
-    system = TRANSLATE_TYPES[token][0].format(**prompt_data)
-    prompt = TRANSLATE_TYPES[token][1].format(**prompt_data)
-    opts = TRANSLATE_TYPES[token][2]
-    options = {
-        "num_ctx": data.num_ctx,
-        **opts,
-    }
-
-    logger.debug("Prompt: " + prompt.replace("\n", "\\n").replace("\t", "\\t"))
-    logger.debug("System: " + system.replace("\n", "\\n").replace("\t", "\\t"))
-
-    logger.debug("Querying Ollama")
-    time = timeit.default_timer()
-    response = data.client.generate(model=data.model, prompt=prompt, system=system, options=options)
-    logger.debug(f"Responded in {timeit.default_timer() - time:.2f}s")
-    logger.debug(f"Response: {response.response}")
-    text = response.response.strip()
-
-    return text.lower().strip().startswith("yes") or "no" not in text.lower().split()
+    notes = advise(original_content, translated_content, section_type) if data.prevalidate else None
+    approved, reason = yield from _critic_verdict(
+        data, f"translation_critic_{section_type}", values=prompt_data, notes=notes
+    )
+    if not approved:
+        logger.debug(f"Validation failed. Reason: {reason}")
+    return approved
@@ -0,0 +1,119 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+from turtletranslate import TurtleTranslator
+from turtletranslate.file_handler import load_translations_from_file
+from turtletranslate.logger import logger
+
+
+class Watcher:
+    """
+    Poll a directory of source documents and retranslate the ones that are edited.
+
+    The client, the parse cache and a checksum -> translation index per (document, language) are kept in memory
+    between edits, so only sections whose checksum changed are sent to the LLM. Saves are debounced, so a burst of
+    writes to the same file only triggers a single translation.
+    """
+
+    def __init__(
+        self,
+        source_dir: Path,
+        targets: Callable[[Path], list[tuple[Path, str]]],
+        translator_options: dict,
+        glob: str = "**/*.md",
+        interval: float = 1.0,
+        debounce: float = 1.0,
+    ):
+        """
+        :param source_dir: Directory containing the source documents.
+        :param targets: Function returning a list of (target path, target language) for a source document.
+        :param translator_options: Keyword arguments for TurtleTranslator (client, model, source_language, etc.).
+        :param glob: Glob pattern for source documents.
+        :param interval: Seconds between each poll of the source directory.
+        :param debounce: Seconds a document must be left untouched before it is translated.
+        """
+        self.source_dir = Path(source_dir)
+        self.targets = targets
+        self.translator_options = translator_options
+        self.glob = glob
+        self.interval = interval
+        self.debounce = debounce
+        self._snapshot = self._stat_all()
+        self._pending = dict()  # Source -> time of the last observed change
+        self._reuse = dict()  # (source, target) -> checksum -> translation
+        self._similarity = dict()  # (source, target) -> SimilarityIndex of the latest version
+
+    def _stat_all(self) -> dict[Path, tuple[int, int]]:
+        snapshot = dict()
+        for path in self.source_dir.glob(self.glob):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed between globbing and stat
+            if path.is_file():
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self) -> list[Path]:
+        """Check for changes once, and translate documents that have settled. Returns the translated documents."""
+        now = time.monotonic()
+        snapshot = self._stat_all()
+        for path, stat in snapshot.items():
+            if self._snapshot.get(path) != stat:
+                self._pending[path] = now
+        self._snapshot = snapshot
+
+        settled = [path for path, changed in self._pending.items() if now - changed >= self.debounce]
+        for path in settled:
+            del self._pending[path]
+            if path in snapshot:
+                self.translate(path)
+        return [path for path in settled if path in snapshot]
+
+    def translate(self, source: Path):
+        """Translate a single source document into every target, reusing unchanged sections from memory."""
+        try:
+            document = source.read_text(encoding="utf-8")
+        except OSError as e:
+            logger.error(f"Could not read {source}: {e}")
+            return
+
+        for target, language in self.targets(source):
+            key = (source, target)
+            if key not in self._reuse:
+                self._reuse[key] = load_translations_from_file(target) if os.path.exists(target) else dict()
+            turtle = TurtleTranslator(
+                **self.translator_options,
+                document=document,
+                target_language=language,
+                target_filename=str(target),
+                reuse_index=self._reuse[key],
+                similarity_index=self._similarity.get(key),
+            )
+            try:
+                turtle.translate()
+            except Exception as e:
+                logger.error(f"Failed to translate {source} ({language}): {e}")
+                continue
+            if not turtle.written:
+                logger.error(f"Could not write {target}")  # Keeps the indexes of the version that is on disk
+                continue
+            # Keep only the sections of the latest version, so the index does not grow with every edit
+            self._reuse[key] = {
+                s["checksum"]: text for s in turtle._translated_sections for k, text in s.items() if k != "checksum"
+            }
+            if turtle.similarity_index is not None:
+                self._similarity[key] = turtle.similarity_index
+            logger.info(f"Updated {target}")
+
+    def run(self):
+        """Watch the source directory until interrupted."""
+        logger.info(f"Watching {self.source_dir} for changes (Ctrl+C to stop)")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")